@@ -0,0 +1,56 @@
+"""Use native UUID type for user and transaction keys
+
+Revision ID: e81a6d2b5c37
+Revises: c27f5b9e4d80
+Create Date: 2025-10-30 10:47:12.093318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81a6d2b5c37'
+down_revision = 'c27f5b9e4d80'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_constraint('transactions_user_id_fkey', 'transactions', type_='foreignkey')
+    op.alter_column('users', 'id',
+               existing_type=sa.String(length=36),
+               type_=sa.Uuid(),
+               existing_nullable=False,
+               postgresql_using='id::uuid')
+    op.alter_column('transactions', 'uid',
+               existing_type=sa.String(length=36),
+               type_=sa.Uuid(),
+               existing_nullable=False,
+               postgresql_using='uid::uuid')
+    op.alter_column('transactions', 'user_id',
+               existing_type=sa.String(length=36),
+               type_=sa.Uuid(),
+               existing_nullable=False,
+               postgresql_using='user_id::uuid')
+    op.create_foreign_key('transactions_user_id_fkey', 'transactions', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('transactions_user_id_fkey', 'transactions', type_='foreignkey')
+    op.alter_column('transactions', 'user_id',
+               existing_type=sa.Uuid(),
+               type_=sa.String(length=36),
+               existing_nullable=False,
+               postgresql_using='user_id::text')
+    op.alter_column('transactions', 'uid',
+               existing_type=sa.Uuid(),
+               type_=sa.String(length=36),
+               existing_nullable=False,
+               postgresql_using='uid::text')
+    op.alter_column('users', 'id',
+               existing_type=sa.Uuid(),
+               type_=sa.String(length=36),
+               existing_nullable=False,
+               postgresql_using='id::text')
+    op.create_foreign_key('transactions_user_id_fkey', 'transactions', 'users', ['user_id'], ['id'], ondelete='CASCADE')
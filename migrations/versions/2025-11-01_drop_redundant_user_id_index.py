@@ -0,0 +1,26 @@
+"""Drop ix_transactions_user_id, covered by ix_transactions_user_created
+
+Revision ID: 7c3e91f0ab52
+Revises: 4a9f0c6e2d15
+Create Date: 2025-11-01 11:03:27.518904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3e91f0ab52'
+down_revision = '4a9f0c6e2d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_transactions_user_id', table_name='transactions', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_transactions_user_id', 'transactions', ['user_id'], unique=False, postgresql_concurrently=True)
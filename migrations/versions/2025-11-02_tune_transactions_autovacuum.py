@@ -0,0 +1,35 @@
+"""Vacuum transactions after inserts to keep index-only scans heap-free
+
+Revision ID: b5d20e8f7a19
+Revises: 7c3e91f0ab52
+Create Date: 2025-11-02 16:40:51.226713
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d20e8f7a19'
+down_revision = '7c3e91f0ab52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # transactions is append-only; vacuuming after ~1% new rows keeps the
+    # visibility map current, so the covering ix_transactions_user_created
+    # serves history sums without heap fetches
+    op.execute(
+        "ALTER TABLE transactions SET ("
+        "autovacuum_vacuum_insert_scale_factor = 0.01, "
+        "autovacuum_vacuum_insert_threshold = 1000)"
+    )
+
+
+def downgrade():
+    op.execute(
+        "ALTER TABLE transactions RESET ("
+        "autovacuum_vacuum_insert_scale_factor, "
+        "autovacuum_vacuum_insert_threshold)"
+    )
@@ -0,0 +1,38 @@
+"""Generate user and transaction UUID keys server-side
+
+Revision ID: 2f6a8c4d1e73
+Revises: b5d20e8f7a19
+Create Date: 2025-11-03 09:12:37.580164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f6a8c4d1e73'
+down_revision = 'b5d20e8f7a19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('users', 'id',
+               existing_type=sa.Uuid(),
+               server_default=sa.text('gen_random_uuid()'),
+               existing_nullable=False)
+    op.alter_column('transactions', 'uid',
+               existing_type=sa.Uuid(),
+               server_default=sa.text('gen_random_uuid()'),
+               existing_nullable=False)
+
+
+def downgrade():
+    op.alter_column('transactions', 'uid',
+               existing_type=sa.Uuid(),
+               server_default=None,
+               existing_nullable=False)
+    op.alter_column('users', 'id',
+               existing_type=sa.Uuid(),
+               server_default=None,
+               existing_nullable=False)
@@ -1,127 +1,123 @@
-from typing import Annotated, Optional
-from uuid import uuid4
+import typing
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 
-from fastapi import Depends, Header, HTTPException, status
+import orjson
+from fastapi import Depends
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession as AsyncSessionType
-from sqlalchemy.ext.asyncio import async_sessionmaker
 
-from app import schemas
-from app.models import User
 from app.services.idempotency_service import IdempotencyService
 from app.services.transaction_service import TransactionService
 from app.services.user_service import UserService
 from app.settings import Settings
 from app.utils import (
-    IdempotencyRecord,
-    IdempotencyStatus,
+    RedisBalanceCache,
     RedisIdempotencyStorage,
     get_idempotency_storage,
 )
 
 
+class RowJSONResponse(ORJSONResponse):
+    """JSON response for plain database rows, bypassing response_model.
+
+    Renders Decimal as string and UTC datetimes with a ``Z`` suffix, matching
+    what the pydantic response schemas would produce.
+    """
+
+    def render(self, content: typing.Any) -> bytes:
+        return orjson.dumps(content, default=str, option=orjson.OPT_UTC_Z)
+
+
 def get_settings() -> Settings:
     raise NotImplementedError
 
 
-def get_db() -> async_sessionmaker[AsyncSessionType]:
-    """Database session maker dependency."""
+def get_db() -> AsyncSessionType:
+    """Request-scoped database session dependency."""
     raise NotImplementedError
 
 
-def get_user_service(
-    db: async_sessionmaker[AsyncSessionType] = Depends(get_db),
-) -> UserService:
-    return UserService(session_maker=db)
+# Balance caches keyed by (redis_url, ttl_ms, max_connections). A plain dict
+# rather than lru_cache, so clear_idempotency_caches can close their pools.
+_BALANCE_CACHES: Dict[Tuple[str, int, int], RedisBalanceCache] = {}
 
 
-def get_transaction_service(
-    db: async_sessionmaker[AsyncSessionType] = Depends(get_db),
-) -> TransactionService:
-    return TransactionService(session_maker=db)
+def _balance_cache_for(
+    redis_url: str, ttl_ms: int, max_connections: int
+) -> RedisBalanceCache:
+    """Return the balance cache for a Redis URL, cached across requests."""
+    key = (redis_url, ttl_ms, max_connections)
+    balance_cache = _BALANCE_CACHES.get(key)
+    if balance_cache is None:
+        balance_cache = RedisBalanceCache(
+            redis_url, ttl_ms=ttl_ms, max_connections=max_connections
+        )
+        _BALANCE_CACHES[key] = balance_cache
+    return balance_cache
 
 
-def get_idempotency_service(
+def get_balance_cache(
     settings: Settings = Depends(get_settings),
-) -> IdempotencyService:
-    """Get idempotency service dependency.
+) -> Optional[RedisBalanceCache]:
+    """Get the shared balance cache, or None when it is disabled."""
+    if settings.balance_cache_ttl_ms <= 0:
+        return None
+    return _balance_cache_for(
+        settings.redis_url,
+        settings.balance_cache_ttl_ms,
+        settings.redis_max_connections,
+    )
 
-    Args:
-        settings: Application settings
 
-    Returns:
-        IdempotencyService: Service for managing idempotent operations
-    """
-    from app.services.idempotency_service import IdempotencyService
-    from app.utils import get_idempotency_storage
+def get_user_service(
+    db: AsyncSessionType = Depends(get_db),
+    balance_cache: Optional[RedisBalanceCache] = Depends(get_balance_cache),
+) -> UserService:
+    return UserService(session=db, balance_cache=balance_cache)
 
-    storage = get_idempotency_storage(settings.redis_url)
-    return IdempotencyService(storage)
 
+def get_transaction_service(
+    db: AsyncSessionType = Depends(get_db),
+    balance_cache: Optional[RedisBalanceCache] = Depends(get_balance_cache),
+) -> TransactionService:
+    return TransactionService(session=db, balance_cache=balance_cache)
 
-async def get_existing_user(
-    user_id: str,
-    user_service: UserService = Depends(get_user_service),
-) -> User:
-    """Validate user existence and return user object.
 
-    Args:
-        user_id: User UUID string
-        user_service: Injected user service dependency
+@lru_cache(maxsize=1)
+def _service_for(storage: RedisIdempotencyStorage) -> IdempotencyService:
+    """Return the idempotency service for a storage, cached across requests.
 
-    Returns:
-        User: Validated user model instance
-
-    Raises:
-        HTTPException: 404 if user not found
+    Keyed on the storage instance, so a replaced storage gets a new service.
     """
-    user = await user_service.get_user_by_id(user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-        )
-    return user
-
-
-async def validate_transaction_user(
-    transaction_data: schemas.TransactionCreate,
-    user_service: UserService = Depends(get_user_service),
-) -> schemas.TransactionCreate:
-    """Validate user exists for transaction creation.
+    return IdempotencyService(storage)
 
-    Args:
-        transaction_data: Transaction creation data with user_id
-        user_service: Injected user service dependency
 
-    Returns:
-        TransactionCreate: Validated transaction data
+async def clear_idempotency_caches() -> None:
+    """Drop cached idempotency service and close cached balance caches.
 
-    Raises:
-        HTTPException: 404 if user not found
+    Must be called whenever the global storage is closed or replaced so that
+    subsequent requests do not reuse a stale client.
     """
-    user = await user_service.get_user_by_id(transaction_data.user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-        )
-    return transaction_data
+    _service_for.cache_clear()
+    balance_caches = list(_BALANCE_CACHES.values())
+    _BALANCE_CACHES.clear()
+    for balance_cache in balance_caches:
+        await balance_cache.close()
 
 
-async def get_idempotency_key(
-    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
-) -> str:
-    """Get or generate idempotency key for request deduplication.
+def get_idempotency_service(
+    settings: Settings = Depends(get_settings),
+) -> IdempotencyService:
+    """Get idempotency service dependency.
 
     Args:
-        idempotency_key: Optional idempotency key from header
+        settings: Application settings
 
     Returns:
-        str: Idempotency key (provided or generated)
+        IdempotencyService: Service for managing idempotent operations
     """
-    if idempotency_key:
-        return idempotency_key
-
-    # Generate new key if not provided
-    return str(uuid4())
+    return _service_for(get_storage(settings))
 
 
 def get_storage(settings: Settings = Depends(get_settings)) -> RedisIdempotencyStorage:
@@ -133,85 +129,6 @@ def get_storage(settings: Settings = Depends(get_settings)) -> RedisIdempotencyS
     Returns:
         RedisIdempotencyStorage: Redis storage instance for idempotency
     """
-    return get_idempotency_storage(settings.redis_url)
-
-
-async def check_idempotency(
-    idempotency_key: str = Depends(get_idempotency_key),
-    storage: RedisIdempotencyStorage = Depends(get_storage),
-) -> Optional[IdempotencyRecord]:
-    """Check if request with this idempotency key was already processed.
-
-    Args:
-        idempotency_key: Request idempotency key
-        storage: Storage instance
-
-    Returns:
-        IdempotencyRecord: Existing record if found, None if new request
-
-    Raises:
-        HTTPException: 409 if request is currently in process (retry scenario)
-    """
-    record = await storage.get_idempotency_record(idempotency_key)
-
-    if record is None:
-        return None
-
-    # If request is in process, return 409 Conflict to indicate retry later
-    if record.status == IdempotencyStatus.IN_PROCESS:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Request is currently being processed. Please retry later.",
-        )
-
-    return record
-
-
-async def start_idempotent_operation(
-    idempotency_key: str,
-    storage: RedisIdempotencyStorage = Depends(get_storage),
-) -> bool:
-    """Start an idempotent operation by setting IN_PROCESS status.
-
-    Args:
-        idempotency_key: Request idempotency key
-        storage: Storage instance
-
-    Returns:
-        bool: True if operation started successfully, False if duplicate
-    """
-    return await storage.start_idempotent_operation(idempotency_key, ttl_seconds=3600)
-
-
-async def complete_idempotent_operation(
-    idempotency_key: str,
-    success: bool,
-    response_data: Optional[dict] = None,
-    error: Optional[str] = None,
-    storage: RedisIdempotencyStorage = Depends(get_storage),
-) -> None:
-    """Complete an idempotent operation with success or failure status.
-
-    Args:
-        idempotency_key: Request idempotency key
-        success: True for success, False for failure
-        response_data: Response data for successful operations
-        error: Error message for failed operations
-        storage: Storage instance
-    """
-    await storage.complete_idempotent_operation(
-        idempotency_key,
-        success=success,
-        data=response_data,
-        error=error,
-        ttl_seconds=3600,
+    return get_idempotency_storage(
+        settings.redis_url, max_connections=settings.redis_max_connections
     )
-
-
-# Type aliases for cleaner code
-ExistingUser = Annotated[User, Depends(get_existing_user)]
-ValidatedTransaction = Annotated[
-    schemas.TransactionCreate, Depends(validate_transaction_user)
-]
-IdempotencyKey = Annotated[str, Depends(get_idempotency_key)]
-IdempotentRecord = Annotated[Optional[IdempotencyRecord], Depends(check_idempotency)]
@@ -1,12 +1,13 @@
 """Health check endpoints for Kubernetes probes."""
 
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.base import get_db
-from app.settings import Settings
-from app.utils import get_idempotency_storage
+from app.api.base import get_db, get_storage
+from app.utils import RedisIdempotencyStorage
 
 ROUTER = APIRouter(tags=["Health"])
 
@@ -22,36 +23,43 @@ async def health_check():
     return {"status": "healthy", "service": "balance-service"}
 
 
+async def _check_database(session: AsyncSession) -> bool:
+    """Run a trivial query on the request session."""
+    result = await session.execute(text("SELECT 1"))
+    return result.scalar() == 1
+
+
+async def _check_redis(redis_storage: RedisIdempotencyStorage) -> bool:
+    """Write a short-lived key to verify Redis is reachable."""
+    try:
+        await redis_storage.set("health_check", "test", ttl_seconds=1)
+        return True
+    except Exception:
+        return False
+
+
 @ROUTER.get("/ready")
-async def readiness_check(db: AsyncSession = Depends(get_db)):
+async def readiness_check(
+    db: AsyncSession = Depends(get_db),
+    redis_storage: RedisIdempotencyStorage = Depends(get_storage),
+):
     """
     Readiness probe endpoint.
 
-    Checks if service is ready to handle requests by testing:
+    Checks if service is ready to handle requests by testing, concurrently:
     - Database connectivity
     - Redis connectivity
 
     Used by Kubernetes readiness probe.
     """
     try:
-        # Check database connectivity
-        result = await db.execute(text("SELECT 1"))
-        db_status = result.scalar() == 1
+        db_status, redis_status = await asyncio.gather(
+            _check_database(db), _check_redis(redis_storage)
+        )
 
         if not db_status:
             raise HTTPException(status_code=503, detail="Database not ready")
 
-        # Check Redis connectivity
-        settings = Settings()
-        redis_storage = get_idempotency_storage(redis_url=settings.redis_url)
-
-        try:
-            # Simple Redis ping test
-            await redis_storage.set("health_check", "test", ttl=1)
-            redis_status = True
-        except Exception:
-            redis_status = False
-
         if not redis_status:
             raise HTTPException(status_code=503, detail="Redis not ready")
 
@@ -2,15 +2,12 @@ import logging
 import typing
 
 from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import ORJSONResponse
 from starlette import status
 
 from app import schemas
-from app.api.base import (
-    ValidatedTransaction,
-    get_idempotency_service,
-    get_transaction_service,
-)
-from app.exceptions import PaymentError
+from app.api.base import get_idempotency_service, get_transaction_service
+from app.exceptions import BalanceLockedError, PaymentError, UserNotFoundError
 from app.services.idempotency_service import (
     IdempotencyConflictError,
     IdempotencyFailureError,
@@ -24,10 +21,12 @@ ROUTER: typing.Final = APIRouter(prefix="/transactions", tags=["transactions"])
 
 
 async def _create_transaction(
-    transaction_service: TransactionService, data: ValidatedTransaction
+    transaction_service: TransactionService,
+    data: schemas.TransactionCreate,
+    idempotency_key: typing.Optional[str] = None,
 ) -> schemas.TransactionResponse:
     """Create transaction with logging - extracted for better testability."""
-    transaction = await transaction_service.create_transaction(data)
+    transaction = await transaction_service.create_transaction(data, idempotency_key)
     logger.info(f"Created transaction: {transaction.uid} for user {data.user_id}")
     return transaction
 
@@ -36,37 +35,42 @@ async def _create_transaction(
     "", response_model=schemas.TransactionResponse, status_code=status.HTTP_201_CREATED
 )
 async def create_transaction(
-    data: ValidatedTransaction,
-    idempotency_key: str = Header(None, alias="Idempotency-Key"),
+    data: schemas.TransactionCreate,
+    # Keys are stored in transactions.idempotency_key, a varchar(255)
+    idempotency_key: str = Header(None, alias="Idempotency-Key", max_length=255),
     transaction_service: TransactionService = Depends(get_transaction_service),
     idempotency_service: IdempotencyService = Depends(get_idempotency_service),
-) -> schemas.TransactionResponse:
+) -> typing.Union[schemas.TransactionResponse, ORJSONResponse]:
     """Create a deposit or withdrawal transaction with idempotency support.
 
     Args:
-        data: Validated transaction data with user existence check
+        data: Transaction data; user existence is checked under the row lock
         idempotency_key: Optional idempotency key from header
         transaction_service: Injected transaction service dependency
         idempotency_service: Idempotency service for duplicate prevention
 
     Returns:
-        TransactionResponse: Created transaction with UID and updated balance
+        TransactionResponse: Created transaction with UID and updated balance,
+            or the cached JSON data of a completed key stored without a
+            schema tag
     """
     key = idempotency_service.get_or_generate_key(idempotency_key)
 
     try:
         result = await idempotency_service.execute_idempotent_operation(
             key=key,
-            operation=lambda: _create_transaction(transaction_service, data),
+            operation=lambda: _create_transaction(
+                transaction_service, data, idempotency_key
+            ),
             ttl_seconds=3600,
         )
 
-        # Handle both fresh results and cached dictionary responses
-        return (
-            result
-            if isinstance(result, schemas.TransactionResponse)
-            else schemas.TransactionResponse(**result)
-        )
+        if isinstance(result, schemas.TransactionResponse):
+            return result
+
+        # Only records written before results were tagged with their schema
+        # come back as plain JSON data; send those as is until they expire
+        return ORJSONResponse(result, status_code=status.HTTP_201_CREATED)
 
     except IdempotencyConflictError:
         raise HTTPException(
@@ -75,6 +79,16 @@ async def create_transaction(
         )
     except IdempotencyFailureError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except BalanceLockedError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Balance is being updated by another request. Please retry.",
+            headers={"Retry-After": "1"},
+        )
+    except UserNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+        )
     except PaymentError as e:
         logger.warning(f"Transaction failed: {str(e)}")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
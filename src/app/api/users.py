@@ -7,7 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from starlette import status
 
 from app import schemas
-from app.api.base import ExistingUser, get_transaction_service, get_user_service
+from app.api.base import RowJSONResponse, get_transaction_service, get_user_service
 from app.exceptions import UserExistsError
 from app.services.transaction_service import TransactionService
 from app.services.user_service import UserService
@@ -36,7 +36,7 @@ async def create_user(
     try:
         user = await user_service.create_user(data)
         logger.info(f"Created user: {user.id}")
-        return schemas.UserResponse.model_validate(user)
+        return schemas.UserResponse.from_row(user)
     except UserExistsError as e:
         logger.warning(f"User creation failed: {e}")
         raise HTTPException(
@@ -46,37 +46,58 @@ async def create_user(
 
 
 @ROUTER.get("/{user_id}", response_model=schemas.UserResponse)
-async def get_user(user: ExistingUser) -> schemas.UserResponse:
+async def get_user(
+    user_id: str,
+    user_service: UserService = Depends(get_user_service),
+) -> RowJSONResponse:
     """Get user information including current balance.
 
     Args:
-        user: User object (automatically validated by dependency)
+        user_id: User UUID string
+        user_service: Injected user service dependency
 
     Returns:
-        UserResponse: User data with ID, name and balance
+        RowJSONResponse: User data with ID, name and balance
+
+    Raises:
+        HTTPException: 404 if user not found
     """
-    return schemas.UserResponse.model_validate(user)
+    user = await user_service.get_user_dict_by_id(user_id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+        )
+    return RowJSONResponse(user)
 
 
 @ROUTER.get("/{user_id}/balance", response_model=schemas.UserBalanceResponse)
 async def get_user_balance(
-    user: ExistingUser,
+    user_id: str,
     timestamp: Optional[datetime] = Query(None),
+    user_service: UserService = Depends(get_user_service),
     transaction_service: TransactionService = Depends(get_transaction_service),
 ) -> schemas.UserBalanceResponse:
     """Get user balance (current or historical).
 
     Args:
-        user: User object (automatically validated by dependency)
+        user_id: User UUID string
         timestamp: Optional datetime for historical balance lookup
+        user_service: Injected user service dependency
         transaction_service: Injected transaction service dependency
 
     Returns:
         UserBalanceResponse: User balance at specified time or current
+
+    Raises:
+        HTTPException: 404 if user not found
     """
-    if timestamp is None:
-        balance = user.balance
-    else:
-        balance = await transaction_service.get_user_balance_at_time(user.id, timestamp)
+    balance = await user_service.get_user_balance(user_id)
+    if balance is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+        )
+
+    if timestamp is not None:
+        balance = await transaction_service.get_user_balance_at_time(user_id, timestamp)
 
     return schemas.UserBalanceResponse(balance=balance)
@@ -1,13 +1,20 @@
+import asyncio
 import contextlib
 import typing
 
 import fastapi
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.ext.asyncio import AsyncSession as AsyncSessionType
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.api import health, transactions, users
-from app.api.base import get_db, get_settings
+from app.api.base import (
+    clear_idempotency_caches,
+    get_db,
+    get_settings,
+)
 from app.settings import Settings
 from app.utils import get_idempotency_storage
 
@@ -30,16 +37,18 @@ class AppBuilder:
             title=self.settings.service_name,
             debug=self.settings.debug,
             lifespan=self.lifespan_manager,
+            default_response_class=ORJSONResponse,
         )
 
         self.app.dependency_overrides[get_db] = self._get_db
         self.app.dependency_overrides[get_settings] = self._get_settings
         include_routers(self.app)
 
-    def _get_db(self) -> async_sessionmaker[AsyncSessionType]:
+    async def _get_db(self) -> typing.AsyncIterator[AsyncSessionType]:
         if self._session_maker is None:
             raise RuntimeError("Database session maker not initialized")
-        return self._session_maker
+        async with self._session_maker() as session:
+            yield session
 
     def _get_settings(self) -> Settings:
         return self.settings
@@ -50,8 +59,20 @@ class AppBuilder:
         self._async_engine = create_async_engine(
             self.settings.db_dsn,
             echo=self.settings.debug,
-            pool_pre_ping=True,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=self.settings.db_pool_size,
+            max_overflow=self.settings.db_max_overflow,
+            pool_timeout=self.settings.db_pool_timeout,
+            pool_recycle=self.settings.db_pool_recycle,
+            pool_pre_ping=self.settings.db_pool_pre_ping,
+            connect_args={
+                "prepared_statement_cache_size": self.settings.db_statement_cache_size,
+                "server_settings": {
+                    "lock_timeout": str(self.settings.db_lock_timeout_ms)
+                },
+            },
         )
+        await self._warm_up_pool()
 
         # Create session maker
         self._session_maker = async_sessionmaker(
@@ -60,16 +81,35 @@ class AppBuilder:
 
         # Redis will be initialized lazily when first accessed
 
+    async def _warm_up_pool(self) -> None:
+        """Pre-open pool connections so the first requests skip the handshake."""
+        engine = self._async_engine
+        if engine is None or self.settings.db_pool_warmup <= 0:
+            return
+
+        async def _checkout() -> None:
+            async with engine.connect():
+                pass
+
+        await asyncio.gather(
+            *(_checkout() for _ in range(self.settings.db_pool_warmup))
+        )
+
     async def tear_down(self) -> None:
         # Close Redis connection
         try:
             idempotency_storage = get_idempotency_storage(
-                redis_url=self.settings.redis_url
+                redis_url=self.settings.redis_url,
+                max_connections=self.settings.redis_max_connections,
             )
             await idempotency_storage.close()
         except Exception as e:
             # Log error but don't fail teardown
             print(f"Error closing Redis connection: {e}")
+        try:
+            await clear_idempotency_caches()
+        except Exception as e:
+            print(f"Error closing Redis balance cache: {e}")
 
         # Dispose database engine
         if self._async_engine is not None:
@@ -2,5 +2,17 @@ class PaymentError(Exception):
     pass
 
 
+class UserNotFoundError(PaymentError):
+    pass
+
+
 class UserExistsError(Exception):
     pass
+
+
+class RetryableError(Exception):
+    """Transient failure; the same request may be retried later."""
+
+
+class BalanceLockedError(RetryableError):
+    pass
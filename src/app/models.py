@@ -19,11 +19,43 @@ class Base(DeclarativeBase):
     metadata = METADATA
 
 
+NIL_UUID: typing.Final = uuid.UUID(int=0)
+GEN_RANDOM_UUID: typing.Final = sa.text("gen_random_uuid()")
+
+
+class UUIDString(sa.TypeDecorator):
+    """Native 16-byte UUID column exposed to Python as a string.
+
+    Ids are parsed once and bound as ``uuid.UUID`` so asyncpg sends the binary
+    UUID encoding. Malformed identifiers bind as the nil UUID, which is never
+    generated, so lookups by such ids find nothing instead of failing in the
+    driver.
+    """
+
+    impl = sa.Uuid(as_uuid=True)
+    cache_ok = True
+
+    def process_bind_param(
+        self, value: typing.Optional[typing.Union[str, uuid.UUID]], dialect: sa.Dialect
+    ) -> typing.Optional[uuid.UUID]:
+        if value is None or isinstance(value, uuid.UUID):
+            return value
+        try:
+            return uuid.UUID(value)
+        except (TypeError, ValueError):
+            return NIL_UUID
+
+    def process_result_value(
+        self, value: typing.Optional[uuid.UUID], dialect: sa.Dialect
+    ) -> typing.Optional[str]:
+        return None if value is None else str(value)
+
+
 class User(Base):
     __tablename__ = "users"
 
     id: Mapped[str] = mapped_column(
-        sa.String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+        UUIDString(), primary_key=True, server_default=GEN_RANDOM_UUID
     )
     name: Mapped[str] = mapped_column(sa.String(255), nullable=False)
     balance: Mapped[Decimal] = mapped_column(
@@ -45,7 +77,7 @@ class Transaction(Base):
     __tablename__ = "transactions"
 
     uid: Mapped[str] = mapped_column(
-        sa.String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+        UUIDString(), primary_key=True, server_default=GEN_RANDOM_UUID
     )
     type: Mapped[TransactionType] = mapped_column(
         sa.Enum(TransactionType), nullable=False
@@ -53,22 +85,64 @@ class Transaction(Base):
     amount: Mapped[Decimal] = mapped_column(
         sa.Numeric(precision=20, scale=2), nullable=False
     )
+    # Balance delta computed once at insert, so history sums need no CASE
+    signed_amount: Mapped[Decimal] = mapped_column(
+        sa.Numeric(precision=20, scale=2),
+        sa.Computed(
+            "CASE WHEN type = 'WITHDRAW' THEN -amount ELSE amount END", persisted=True
+        ),
+    )
     created_at: Mapped[datetime.datetime] = mapped_column(
         sa.DateTime(timezone=True),
         nullable=False,
         default=lambda: datetime.datetime.now(datetime.timezone.utc),
     )
     user_id: Mapped[str] = mapped_column(
-        sa.String(36), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        UUIDString(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    idempotency_key: Mapped[typing.Optional[str]] = mapped_column(
+        sa.String(255), nullable=True
     )
 
-    # Relationship
-    user: Mapped["User"] = relationship("User", back_populates="transactions")
+    # Relationship; an async session cannot lazy-load, so loading the user
+    # must be explicit (selectinload) or come from the identity map
+    user: Mapped["User"] = relationship(
+        "User", back_populates="transactions", lazy="raise_on_sql"
+    )
 
     # Indexes for performance
     __table_args__ = (
-        sa.Index("ix_transactions_user_id", "user_id"),
         sa.Index("ix_transactions_created_at", "created_at"),
-        sa.Index("ix_transactions_user_created", "user_id", "created_at"),
+        # Covers the historical balance aggregation so it can run index-only;
+        # its user_id prefix also serves plain per-user lookups
+        sa.Index(
+            "ix_transactions_user_created",
+            "user_id",
+            "created_at",
+            postgresql_include=["signed_amount"],
+        ),
+        sa.Index("ux_transactions_idempotency_key", "idempotency_key", unique=True),
         sa.CheckConstraint("amount > 0", name="check_positive_amount"),
     )
+
+
+class CachedBalance(Base):
+    """Balance checkpoint: the sum of all of a user's transactions up to ``as_of``.
+
+    Historical balances start from the latest checkpoint not after the requested
+    time, so only transactions created after it have to be summed.
+    """
+
+    __tablename__ = "cached_balances"
+
+    user_id: Mapped[str] = mapped_column(
+        UUIDString(),
+        sa.ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    as_of: Mapped[datetime.datetime] = mapped_column(
+        sa.DateTime(timezone=True), primary_key=True
+    )
+    balance: Mapped[Decimal] = mapped_column(
+        sa.Numeric(precision=20, scale=2), nullable=False
+    )
@@ -15,6 +15,12 @@ from app.types import TransactionType
 
 logger = logging.getLogger(__name__)
 
+_SELECT_USER = sa.select(User).where(User.id == sa.bindparam("user_id"))
+_SELECT_USER_BALANCE = sa.select(User.balance).where(User.id == sa.bindparam("user_id"))
+_SELECT_TRANSACTION = sa.select(Transaction).where(
+    Transaction.uid == sa.bindparam("transaction_uid")
+)
+
 
 class PaymentRepository:
     """Repository for payment operations with reduced session nesting."""
@@ -40,8 +46,9 @@ class PaymentRepository:
                 balance=Decimal("0.00"),
             )
             self.session.add(user)
+            # The flush reads the generated id back via RETURNING; every other
+            # column was set client-side, so no refresh SELECT is needed
             await self.session.flush()
-            await self.session.refresh(user)
             return user
         except IntegrityError as e:
             logger.error(f"Failed to create user: {e}")
@@ -56,7 +63,7 @@ class PaymentRepository:
         Returns:
             Optional[User]: User object if found, None otherwise
         """
-        result = await self.session.execute(sa.select(User).where(User.id == user_id))
+        result = await self.session.execute(_SELECT_USER, {"user_id": user_id})
         return result.scalar_one_or_none()
 
     async def get_user_balance(
@@ -73,7 +80,7 @@ class PaymentRepository:
         """
         if ts is None:
             result = await self.session.execute(
-                sa.select(User.balance).where(User.id == user_id)
+                _SELECT_USER_BALANCE, {"user_id": user_id}
             )
             balance = result.scalar_one_or_none()
             return balance
@@ -81,20 +88,7 @@ class PaymentRepository:
             result = await self.session.execute(
                 sa.select(
                     sa.func.coalesce(
-                        sa.func.sum(
-                            sa.case(
-                                (
-                                    Transaction.type == TransactionType.DEPOSIT,
-                                    Transaction.amount,
-                                ),
-                                (
-                                    Transaction.type == TransactionType.WITHDRAW,
-                                    -Transaction.amount,
-                                ),
-                                else_=Decimal("0"),
-                            )
-                        ),
-                        Decimal("0"),
+                        sa.func.sum(Transaction.signed_amount), Decimal("0")
                     )
                 ).where(
                     sa.and_(
@@ -168,6 +162,6 @@ class PaymentRepository:
             Optional[Transaction]: Transaction object if found, None otherwise
         """
         result = await self.session.execute(
-            sa.select(Transaction).where(Transaction.uid == transaction_uid)
+            _SELECT_TRANSACTION, {"transaction_uid": transaction_uid}
         )
         return result.scalar_one_or_none()
@@ -1,82 +1,230 @@
 import logging
-from datetime import datetime
+import uuid
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Callable, Optional
+from typing import Final, Optional, Tuple
 
 import sqlalchemy as sa
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError, IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession as AsyncSessionType
-from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from app import schemas
-from app.exceptions import PaymentError
-from app.models import Transaction, User
-from app.types import TransactionType
+from app.exceptions import BalanceLockedError, PaymentError, UserNotFoundError
+from app.models import CachedBalance, Transaction, User
 
 logger = logging.getLogger(__name__)
 
+# A historical read that had to sum this many transactions writes a checkpoint
+CHECKPOINT_MIN_ROWS: Final = 1000
+# Checkpoints stay this far behind now, so no transaction still in flight can
+# commit with a created_at before them
+CHECKPOINT_GRACE: Final = timedelta(minutes=5)
+NEGATIVE_INFINITY: Final = sa.literal_column("'-infinity'::timestamptz")
+# SQLSTATE raised when lock_timeout expires
+LOCK_NOT_AVAILABLE: Final = "55P03"
+
+# Columns a transaction response is built from
+TRANSACTION_COLUMNS: Final = (
+    Transaction.uid,
+    Transaction.amount,
+    Transaction.type,
+    Transaction.user_id,
+    Transaction.created_at,
+)
+
+
+def _build_balance_history_query() -> sa.Select:
+    """Build SQL query for calculating historical balance.
+
+    Bound parameters: ``user_id`` and ``timestamp``; a ``None`` timestamp
+    means the database's ``now()``.
+
+    Returns:
+        SQLAlchemy select query returning the balance and the number of
+        transactions summed on top of the checkpoint
+    """
+    user_id = sa.bindparam("user_id")
+    timestamp = sa.func.coalesce(
+        sa.bindparam("timestamp", type_=sa.DateTime(timezone=True)), sa.func.now()
+    )
+    checkpoint = (
+        sa.select(CachedBalance.as_of, CachedBalance.balance)
+        .where(CachedBalance.user_id == user_id, CachedBalance.as_of <= timestamp)
+        .order_by(CachedBalance.as_of.desc())
+        .limit(1)
+        .cte("checkpoint")
+    )
+    checkpoint_as_of = sa.select(checkpoint.c.as_of).scalar_subquery()
+    checkpoint_balance = sa.select(checkpoint.c.balance).scalar_subquery()
+
+    return sa.select(
+        sa.func.coalesce(checkpoint_balance, Decimal("0"))
+        + sa.func.coalesce(sa.func.sum(Transaction.signed_amount), Decimal("0")),
+        sa.func.count(),
+    ).where(
+        sa.and_(
+            Transaction.user_id == user_id,
+            Transaction.created_at
+            > sa.func.coalesce(checkpoint_as_of, NEGATIVE_INFINITY),
+            Transaction.created_at <= timestamp,
+        )
+    )
+
+
+# Hot statements are built once and executed with bound parameters, so each
+# call skips clause construction and reuses the same compiled-cache entry and
+# server-side prepared statement.
+_SELECT_TRANSACTION = sa.select(Transaction).where(
+    Transaction.uid == sa.bindparam("transaction_uid")
+)
+_SELECT_TRANSACTION_ROW = sa.select(*TRANSACTION_COLUMNS).where(
+    Transaction.uid == sa.bindparam("transaction_uid")
+)
+_SELECT_TRANSACTION_BY_KEY = sa.select(*TRANSACTION_COLUMNS).where(
+    Transaction.idempotency_key == sa.bindparam("idempotency_key")
+)
+_SELECT_USER_EXISTS = sa.select(sa.exists().where(User.id == sa.bindparam("user_id")))
+_BALANCE_DELTA = sa.bindparam("balance_delta", type_=User.balance.type)
+# The conditional balance update runs in a CTE and the transaction insert
+# selects from it, so the whole write is one statement: no row is inserted when
+# the update refused to take the balance below zero or found no user.
+_UPDATED_USER = (
+    sa.update(User)
+    .where(User.id == sa.bindparam("user_id"), User.balance + _BALANCE_DELTA >= 0)
+    .values(balance=User.balance + _BALANCE_DELTA)
+    .returning(User.id)
+    .cte("updated_user")
+)
+_INSERT_TRANSACTION_WITH_BALANCE = (
+    pg_insert(Transaction)
+    .from_select(
+        ["type", "amount", "user_id", "idempotency_key"],
+        sa.select(
+            sa.bindparam("type", type_=Transaction.type.type),
+            sa.bindparam("amount", type_=Transaction.amount.type),
+            _UPDATED_USER.c.id,
+            sa.bindparam("idempotency_key", type_=Transaction.idempotency_key.type),
+        ),
+    )
+    .on_conflict_do_nothing(index_elements=[Transaction.idempotency_key])
+    .returning(*TRANSACTION_COLUMNS)
+)
+_BALANCE_HISTORY = _build_balance_history_query()
+
+
+def _is_same_user(stored_user_id: str, user_id: str) -> bool:
+    """Compare user ids as UUIDs.
+
+    Stored ids are canonical lowercase strings, while the request may spell
+    the same UUID differently (e.g. uppercase), which Postgres accepts. Ids that
+    are not UUIDs fall back to plain string comparison.
+    """
+    try:
+        return uuid.UUID(stored_user_id) == uuid.UUID(user_id)
+    except ValueError:
+        return stored_user_id == user_id
+
 
 class TransactionRepository:
-    def __init__(self, session_maker: async_sessionmaker[AsyncSessionType]):
-        self.session_maker = session_maker
+    def __init__(self, session: AsyncSessionType):
+        self.session = session
 
-    async def create_transaction_with_balance_calculation(
+    async def create_transaction_with_balance_update(
         self,
         data: schemas.TransactionCreate,
-        balance_calculator_func: Callable[[Decimal, TransactionType, Decimal], Decimal],
-    ) -> Transaction:
+        balance_delta: Decimal,
+        idempotency_key: Optional[str] = None,
+    ) -> sa.Row:
         """Create transaction and update user balance atomically.
 
+        The conditional balance ``UPDATE`` and the transaction ``INSERT ... ON
+        CONFLICT DO NOTHING`` on the idempotency key are sent as one statement.
+        When it inserts nothing, the transaction is rolled back (a replayed key
+        still ran the balance update) and the cause is looked up: a replay
+        returns the originally created transaction, otherwise the user is
+        missing or funds are insufficient.
+
         Args:
             data: Transaction creation data
-            balance_calculator_func: Function to calculate new balance
+            balance_delta: Signed amount to add to the user balance
+            idempotency_key: Client-supplied idempotency key, if any
 
         Returns:
-            Transaction: Created transaction with balance_after attribute
+            sa.Row: Response columns of the created (or previously created)
+                transaction
 
         Raises:
-            PaymentError: If transaction fails or user not found
+            UserNotFoundError: If the user does not exist
+            BalanceLockedError: If the user row stayed locked past lock_timeout
+            PaymentError: If funds are insufficient or the transaction fails
         """
+        session = self.session
         try:
-            async with self.session_maker() as session:
-                async with session.begin():
-                    user = await self._get_user_with_lock(session, data.user_id)
-                    new_balance = await self._calculate_new_balance(
-                        user.balance, data, balance_calculator_func
-                    )
-                    transaction = await self._create_transaction_record(
-                        session, data, new_balance
-                    )
-                    await self._update_user_balance(session, data.user_id, new_balance)
-                    await session.flush()
-                    return transaction
+            result = await session.execute(
+                _INSERT_TRANSACTION_WITH_BALANCE,
+                {
+                    "user_id": data.user_id,
+                    "balance_delta": balance_delta,
+                    "type": data.type,
+                    "amount": data.amount,
+                    "idempotency_key": idempotency_key,
+                },
+            )
+            transaction = result.one_or_none()
+            if transaction is None:
+                await session.rollback()
+                return await self._resolve_rejected_insert(
+                    session, data.user_id, idempotency_key
+                )
+            await session.commit()
+            return transaction
         except IntegrityError as e:
+            await session.rollback()
             logger.error(f"Transaction integrity error: {e}")
             raise PaymentError("Transaction already exists or user not found")
-
-    async def _calculate_new_balance(
+        except DBAPIError as e:
+            await session.rollback()
+            if getattr(e.orig, "sqlstate", None) == LOCK_NOT_AVAILABLE:
+                raise BalanceLockedError(f"Balance of user {data.user_id} is busy")
+            raise
+        except Exception:
+            await session.rollback()
+            raise
+
+    async def _resolve_rejected_insert(
         self,
-        current_balance: Decimal,
-        data: schemas.TransactionCreate,
-        balance_calculator_func: Callable[[Decimal, TransactionType, Decimal], Decimal],
-    ) -> Decimal:
-        """Calculate new balance using provided calculator function.
+        session: AsyncSessionType,
+        user_id: str,
+        idempotency_key: Optional[str],
+    ) -> sa.Row:
+        """Find out why the combined balance update and insert wrote nothing.
 
         Args:
-            current_balance: User's current balance
-            data: Transaction data
-            balance_calculator_func: Business logic function for balance calculation
+            session: Active database session
+            user_id: User UUID string of the request
+            idempotency_key: Client-supplied idempotency key, if any
 
         Returns:
-            Decimal: New calculated balance
+            sa.Row: Response columns of the transaction created by the original
+                request, when the idempotency key was already used
 
         Raises:
-            PaymentError: If balance calculation fails
+            UserNotFoundError: If the user does not exist
+            PaymentError: If the key belongs to another user's transaction, or
+                funds are insufficient
         """
-        try:
-            return balance_calculator_func(current_balance, data.type, data.amount)
-        except ValueError as e:
-            raise PaymentError(str(e))
+        if idempotency_key is not None:
+            transaction = await self._get_transaction_by_idempotency_key(
+                session, user_id, idempotency_key
+            )
+            if transaction is not None:
+                return transaction
+
+        result = await session.execute(_SELECT_USER_EXISTS, {"user_id": user_id})
+        if not result.scalar():
+            raise UserNotFoundError(f"User with id {user_id} not found")
+        raise PaymentError("Insufficient funds for withdrawal")
 
     async def get_transaction_by_id(self, transaction_id: str) -> Optional[Transaction]:
         """Get transaction by internal ID.
@@ -87,28 +235,27 @@ class TransactionRepository:
         Returns:
             Optional[Transaction]: Transaction if found, None otherwise
         """
-        async with self.session_maker() as session:
-            result = await session.execute(
-                sa.select(Transaction).where(Transaction.id == transaction_id)
-            )
-            return result.scalar_one_or_none()
+        result = await self.session.execute(
+            sa.select(Transaction).where(Transaction.id == transaction_id)
+        )
+        return result.scalar_one_or_none()
 
-    async def get_transaction_by_uid(
+    async def get_transaction_row_by_uid(
         self, transaction_uid: str
-    ) -> Optional[Transaction]:
-        """Get transaction by UID.
+    ) -> Optional[sa.Row]:
+        """Get the response columns of a transaction without loading an ORM object.
 
         Args:
             transaction_uid: Transaction UID string
 
         Returns:
-            Optional[Transaction]: Transaction if found, None otherwise
+            Optional[sa.Row]: Row with uid, amount, type, user_id and created_at
+                if found, None otherwise
         """
-        async with self.session_maker() as session:
-            result = await session.execute(
-                sa.select(Transaction).where(Transaction.uid == transaction_uid)
-            )
-            return result.scalar_one_or_none()
+        result = await self.session.execute(
+            _SELECT_TRANSACTION_ROW, {"transaction_uid": transaction_uid}
+        )
+        return result.one_or_none()
 
     async def calculate_balance_at_time(
         self, user_id: str, timestamp: datetime
@@ -124,73 +271,33 @@ class TransactionRepository:
         """
         return await self.get_user_balance_at_time(user_id, timestamp)
 
-    async def _get_user_with_lock(
-        self, session: AsyncSessionType, user_id: str
-    ) -> User:
-        """Get user with row lock for concurrent transaction safety.
+    async def _get_transaction_by_idempotency_key(
+        self, session: AsyncSessionType, user_id: str, idempotency_key: str
+    ) -> Optional[sa.Row]:
+        """Get the transaction previously created for an idempotency key.
 
         Args:
             session: Active database session
-            user_id: User UUID string
+            user_id: User UUID string of the replayed request
+            idempotency_key: Client-supplied idempotency key
 
         Returns:
-            User: User instance with exclusive lock
+            Optional[sa.Row]: Response columns of the transaction created by the
+                original request, None if no transaction has the key
 
         Raises:
-            PaymentError: If user not found
+            PaymentError: If the key belongs to another user's transaction
         """
         result = await session.execute(
-            sa.select(User).with_for_update().where(User.id == user_id)
+            _SELECT_TRANSACTION_BY_KEY, {"idempotency_key": idempotency_key}
         )
-        user = result.scalar_one_or_none()
+        transaction = result.one_or_none()
 
-        if not user:
-            raise PaymentError(f"User with id {user_id} not found")
+        if transaction is None:
+            return None
+        if not _is_same_user(transaction.user_id, user_id):
+            raise PaymentError("Idempotency key already used by another user")
 
-        return user
-
-    async def _update_user_balance(
-        self, session: AsyncSessionType, user_id: str, new_balance: Decimal
-    ) -> None:
-        """Update user balance within existing transaction session.
-
-        Args:
-            session: Active database session
-            user_id: User UUID string
-            new_balance: New balance to set
-        """
-        await session.execute(
-            sa.update(User).where(User.id == user_id).values(balance=new_balance)
-        )
-
-    async def _create_transaction_record(
-        self,
-        session: AsyncSessionType,
-        data: schemas.TransactionCreate,
-        balance_after: Decimal,
-    ) -> Transaction:
-        """Create and persist transaction record.
-
-        Args:
-            session: Active database session
-            data: Transaction creation data
-            balance_after: User balance after transaction
-
-        Returns:
-            Transaction: Created transaction with balance_after attribute
-        """
-        transaction = Transaction(
-            type=data.type,
-            amount=data.amount,
-            user_id=data.user_id,
-        )
-        # Store balance_after as a runtime attribute (not persisted to DB)
-        transaction.balance_after = balance_after
-        session.add(transaction)
-        await session.flush()
-        await session.refresh(transaction)
-        # Re-set the balance_after since it won't be loaded from DB
-        transaction.balance_after = balance_after
         return transaction
 
     async def get_transaction_by_uid(
@@ -204,8 +311,7 @@ class TransactionRepository:
         Returns:
             Optional[Transaction]: Transaction if found, None otherwise
         """
-        async with self.session_maker() as session:
-            return await self._get_transaction_by_uid(session, transaction_uid)
+        return await self._get_transaction_by_uid(self.session, transaction_uid)
 
     async def _get_transaction_by_uid(
         self, session: AsyncSessionType, transaction_uid: str
@@ -220,56 +326,76 @@ class TransactionRepository:
             Optional[Transaction]: Transaction if found, None otherwise
         """
         result = await session.execute(
-            sa.select(Transaction).where(Transaction.uid == transaction_uid)
+            _SELECT_TRANSACTION, {"transaction_uid": transaction_uid}
         )
         return result.scalar_one_or_none()
 
     async def get_user_balance_at_time(
-        self, user_id: str, timestamp: datetime
+        self, user_id: str, timestamp: Optional[datetime] = None
     ) -> Decimal:
         """Calculate user balance up to specific timestamp.
 
+        The sum starts from the latest balance checkpoint not after
+        ``timestamp``. When a read still had to sum many transactions, it leaves
+        a new checkpoint behind for the next one.
+
         Args:
             user_id: User UUID string
-            timestamp: Target datetime for balance calculation
+            timestamp: Target datetime for balance calculation; None means now
 
         Returns:
             Decimal: Calculated balance at specified time
         """
-        async with self.session_maker() as session:
-            query = self._build_balance_history_query(user_id, timestamp)
-            result = await session.execute(query)
-            return result.scalar() or Decimal("0")
+        balance, summed_rows = await self._sum_balance_history(user_id, timestamp)
+        if summed_rows >= CHECKPOINT_MIN_ROWS:
+            await self._save_balance_checkpoint(user_id, timestamp, balance)
+        return balance
 
-    def _build_balance_history_query(self, user_id: str, timestamp: datetime):
-        """Build SQL query for calculating historical balance.
+    async def _save_balance_checkpoint(
+        self, user_id: str, timestamp: Optional[datetime], balance: Decimal
+    ) -> None:
+        """Store a balance checkpoint, keeping it behind in-flight transactions.
+
+        Failing to store a checkpoint only costs future reads, so errors are
+        logged and swallowed.
 
         Args:
             user_id: User UUID string
-            timestamp: Target datetime
-
-        Returns:
-            SQLAlchemy select query for balance calculation
+            timestamp: Time the balance was calculated for; None means now
+            balance: Balance at ``timestamp``
         """
-        return sa.select(
-            sa.func.coalesce(
-                sa.func.sum(self._get_transaction_amount_expression()), Decimal("0")
-            )
-        ).where(
-            sa.and_(
-                Transaction.user_id == user_id,
-                Transaction.created_at <= timestamp,
+        as_of = timestamp
+        if as_of is not None and as_of.tzinfo is None:
+            as_of = as_of.replace(tzinfo=timezone.utc)
+        cutoff = datetime.now(timezone.utc) - CHECKPOINT_GRACE
+        if as_of is None or as_of > cutoff:
+            as_of = cutoff
+            balance, _ = await self._sum_balance_history(user_id, as_of)
+
+        try:
+            await self.session.execute(
+                pg_insert(CachedBalance)
+                .values(user_id=user_id, as_of=as_of, balance=balance)
+                .on_conflict_do_nothing()
             )
-        )
+            await self.session.commit()
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logger.warning(f"Failed to save balance checkpoint for {user_id}: {e}")
 
-    def _get_transaction_amount_expression(self):
-        """Get SQL expression for transaction amount calculation.
+    async def _sum_balance_history(
+        self, user_id: str, timestamp: Optional[datetime]
+    ) -> Tuple[Decimal, int]:
+        """Sum the balance up to a timestamp, starting from the latest checkpoint.
+
+        Args:
+            user_id: User UUID string
+            timestamp: Target datetime; None means the database's ``now()``
 
         Returns:
-            SQLAlchemy case expression for signed transaction amounts
+            Tuple[Decimal, int]: Balance and number of transactions summed
         """
-        return sa.case(
-            (Transaction.type == TransactionType.DEPOSIT, Transaction.amount),
-            (Transaction.type == TransactionType.WITHDRAW, -Transaction.amount),
-            else_=Decimal("0"),
+        result = await self.session.execute(
+            _BALANCE_HISTORY, {"user_id": user_id, "timestamp": timestamp}
         )
+        return result.one()
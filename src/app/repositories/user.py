@@ -1,10 +1,10 @@
 import logging
-from typing import Optional
+from decimal import Decimal
+from typing import Any, Dict, Optional
 
 import sqlalchemy as sa
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession as AsyncSessionType
-from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from app import schemas
 from app.exceptions import UserExistsError
@@ -12,10 +12,18 @@ from app.models import User
 
 logger = logging.getLogger(__name__)
 
+# Hot read statements are built once and executed with bound parameters, so each
+# call skips clause construction and hits the compiled cache directly.
+_SELECT_USER = sa.select(User).where(User.id == sa.bindparam("user_id"))
+_SELECT_USER_FIELDS = sa.select(
+    User.id, User.name, User.balance, User.created_at
+).where(User.id == sa.bindparam("user_id"))
+_SELECT_USER_BALANCE = sa.select(User.balance).where(User.id == sa.bindparam("user_id"))
+
 
 class UserRepository:
-    def __init__(self, session_maker: async_sessionmaker[AsyncSessionType]):
-        self.session_maker = session_maker
+    def __init__(self, session: AsyncSessionType):
+        self.session = session
 
     async def create_user(self, data: schemas.UserCreate) -> User:
         """Create a new user with zero balance.
@@ -30,14 +38,15 @@ class UserRepository:
             UserExistsError: If user creation fails due to constraints
         """
         try:
-            async with self.session_maker() as session:
-                async with session.begin():
-                    user = User(name=data.name)
-                    session.add(user)
-                    await session.flush()
-                    await session.refresh(user)
-                    return user
+            user = User(name=data.name)
+            self.session.add(user)
+            # The flush reads the generated id back via RETURNING; every other
+            # column was set client-side, so no refresh SELECT is needed
+            await self.session.flush()
+            await self.session.commit()
+            return user
         except IntegrityError as e:
+            await self.session.rollback()
             logger.error(f"Failed to create user: {e}")
             raise UserExistsError(f"User with name '{data.name}' might already exist")
 
@@ -50,6 +59,30 @@ class UserRepository:
         Returns:
             Optional[User]: User instance if found, None otherwise
         """
-        async with self.session_maker() as session:
-            result = await session.execute(sa.select(User).where(User.id == user_id))
-            return result.scalar_one_or_none()
+        result = await self.session.execute(_SELECT_USER, {"user_id": user_id})
+        return result.scalar_one_or_none()
+
+    async def get_user_dict_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieve user columns as a plain dict, without building an ORM object.
+
+        Args:
+            user_id: User UUID string
+
+        Returns:
+            Optional[Dict[str, Any]]: User fields if found, None otherwise
+        """
+        result = await self.session.execute(_SELECT_USER_FIELDS, {"user_id": user_id})
+        row = result.mappings().one_or_none()
+        return dict(row) if row is not None else None
+
+    async def get_user_balance(self, user_id: str) -> Optional[Decimal]:
+        """Retrieve only the current balance of a user.
+
+        Args:
+            user_id: User UUID string
+
+        Returns:
+            Optional[Decimal]: Current balance if user exists, None otherwise
+        """
+        result = await self.session.execute(_SELECT_USER_BALANCE, {"user_id": user_id})
+        return result.scalar_one_or_none()
@@ -1,41 +1,63 @@
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import Annotated, Any, Optional, Type, TypeVar
 
 import pydantic
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, StringConstraints, field_validator
 
 from app.types import TransactionType
 
+# Precision transaction amounts are rounded to (whole cents)
+CENTS = Decimal("0.01")
+
 
 class Base(BaseModel):
     model_config = pydantic.ConfigDict(from_attributes=True)
 
 
-# User schemas
-class UserCreate(Base):
-    name: str = Field(..., min_length=1, max_length=255, description="User name")
+R = TypeVar("R", bound="ResponseBase")
 
-    @field_validator("name")
+
+class ResponseBase(Base):
     @classmethod
-    def validate_name(cls, v: str) -> str:
-        if not v.strip():
-            raise ValueError("Name cannot be empty")
-        return v.strip()
+    def from_row(cls: Type[R], row: Any) -> R:
+        """Build a response from a trusted ORM instance or row without validation.
+
+        Only use this for data read from our own database; request input must
+        still go through ``model_validate``.
+
+        Args:
+            row: Object exposing every field of the response as an attribute
+
+        Returns:
+            ResponseBase: Response populated via ``model_construct``
+        """
+        return cls.model_construct(
+            **{name: getattr(row, name) for name in cls.model_fields}
+        )
+
+
+# User schemas
+class UserCreate(Base):
+    # Stripped and length-checked inside pydantic-core, so whitespace-only
+    # names fail min_length
+    name: Annotated[
+        str, StringConstraints(strip_whitespace=True, min_length=1, max_length=255)
+    ] = Field(..., description="User name")
 
 
-class UserResponse(Base):
+class UserResponse(ResponseBase):
     id: str
     name: str
     balance: Decimal = Field(..., json_schema_extra={"example": "1250.75"})
     created_at: datetime
 
 
-class UserBalanceResponse(Base):
+class UserBalanceResponse(ResponseBase):
     balance: Decimal = Field(..., json_schema_extra={"example": "1250.75"})
 
 
-class BalanceResponse(Base):
+class BalanceResponse(ResponseBase):
     user_id: str
     balance: Decimal = Field(..., json_schema_extra={"example": "1250.75"})
 
@@ -54,13 +76,12 @@ class TransactionCreate(Base):
     @field_validator("amount")
     @classmethod
     def validate_amount(cls, v: Decimal) -> Decimal:
-        if v <= 0:
-            raise ValueError("Amount must be positive")
-        # Limit to 2 decimal places for currency
-        return v.quantize(Decimal("0.01"))
+        # gt=0 is already enforced by pydantic-core; limit to 2 decimal places
+        # for currency
+        return v.quantize(CENTS)
 
 
-class TransactionResponse(Base):
+class TransactionResponse(ResponseBase):
     uid: str  # This is the actual ID/primary key
     amount: Decimal = Field(..., json_schema_extra={"example": "100.50"})
     type: TransactionType
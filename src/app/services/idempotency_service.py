@@ -2,11 +2,16 @@
 Idempotency service for handling duplicate request prevention.
 """
 
-import json
 import logging
-from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Type, TypeVar
 from uuid import uuid4
 
+import orjson
+from pydantic import BaseModel
+
+from app import schemas
+from app.exceptions import RetryableError
 from app.utils import (
     IdempotencyRecord,
     IdempotencyStatus,
@@ -18,6 +23,11 @@ logger = logging.getLogger(__name__)
 
 T = TypeVar("T")
 
+# Response models a cached result may be rebuilt into, by class name
+CACHEABLE_MODELS: Dict[str, Type[BaseModel]] = {
+    model.__name__: model for model in (schemas.TransactionResponse,)
+}
+
 
 class IdempotencyService:
     """Service for managing idempotent operations with Redis storage."""
@@ -73,9 +83,9 @@ class IdempotencyService:
         """Execute an operation with full idempotency support.
 
         This is a high-level method that handles the entire idempotency workflow:
-        1. Check for existing operation and return cached result if completed
-        2. Start new operation if not exists
-        3. Execute the operation and cache the result
+        1. Claim the key, or fetch the existing record, in one storage call
+        2. Return the cached result if the existing operation completed
+        3. Otherwise execute the operation and cache the result
 
         Args:
             key: Idempotency key
@@ -90,43 +100,29 @@ class IdempotencyService:
             IdempotencyFailureError: If operation previously failed
             Exception: Any exception from the underlying operation
         """
-        # Check for existing operation
-        existing_record = await self.storage.get_idempotency_record(key)
-
-        if existing_record:
-            return await self._handle_existing_record(existing_record, key)
+        operation_started, record = await self.storage.begin_or_get(key, ttl_seconds)
 
-        # Start new operation
-        operation_started = await self.storage.start_idempotent_operation(
-            key, ttl_seconds
-        )
         if not operation_started:
+            if record:
+                return await self._handle_existing_record(record, key)
             raise IdempotencyConflictError(
                 "Operation is currently being processed by another instance"
             )
 
-        return await self._execute_and_cache(key, operation, ttl_seconds)
+        return await self._execute_and_cache(
+            key, operation, ttl_seconds, record.created_at
+        )
 
     async def _handle_existing_record(self, record: IdempotencyRecord, key: str) -> T:
         """Handle existing idempotency record."""
         if record.status == IdempotencyStatus.SUCCESS:
             logger.info(f"Returning cached successful response for key: {key}")
-            if record.response_data:
-                # Parse JSON back to the original structure
-                data = json.loads(record.response_data)
-                # If the data has the structure of a Pydantic model, try to reconstruct it
-                if isinstance(data, dict) and all(
-                    field in data
-                    for field in ["uid", "amount", "type", "user_id", "created_at"]
-                ):
-                    # This looks like a TransactionResponse
-                    from app.schemas import TransactionResponse
-
-                    return TransactionResponse.model_validate(data)
-                else:
-                    # Return the raw data for other types
-                    return data
-            return None
+            if not record.response_data:
+                return None
+            model = CACHEABLE_MODELS.get(record.schema_name)
+            if model is not None:
+                return model.model_validate_json(record.response_data)
+            return orjson.loads(record.response_data)
 
         elif record.status == IdempotencyStatus.FAILURE:
             logger.info(f"Operation previously failed for key: {key}")
@@ -142,29 +138,46 @@ class IdempotencyService:
         key: str,
         operation: Callable[[], Awaitable[T]],
         ttl_seconds: Optional[int],
+        created_at: Optional[datetime] = None,
     ) -> T:
         """Execute operation and cache the result."""
         try:
             result = await operation()
 
-            # Serialize response for caching with proper enum handling
-            if hasattr(result, "model_dump"):
-                # Use mode='json' to ensure enums are serialized as their values, not string representations
-                response_data = result.model_dump(mode="json")
+            # Cache successful result; models are dumped to JSON in one pass
+            # and tagged so a cache hit can validate straight from the JSON
+            if isinstance(result, BaseModel):
+                await self.storage.complete_idempotent_operation(
+                    key=key,
+                    success=True,
+                    data_json=result.model_dump_json(),
+                    schema_name=type(result).__name__,
+                    ttl_seconds=ttl_seconds,
+                    created_at=created_at,
+                )
             else:
-                response_data = result
-
-            # Cache successful result
-            await self.storage.complete_idempotent_operation(
-                key=key, success=True, data=response_data, ttl_seconds=ttl_seconds
-            )
+                await self.storage.complete_idempotent_operation(
+                    key=key,
+                    success=True,
+                    data=result,
+                    ttl_seconds=ttl_seconds,
+                    created_at=created_at,
+                )
 
             return result
 
+        except RetryableError:
+            # Transient failure: free the key so a retry runs the operation
+            await self.storage.delete(key)
+            raise
         except Exception as e:
             # Cache failure
             await self.storage.complete_idempotent_operation(
-                key=key, success=False, error=str(e), ttl_seconds=ttl_seconds
+                key=key,
+                success=False,
+                error=str(e),
+                ttl_seconds=ttl_seconds,
+                created_at=created_at,
             )
             raise
 
@@ -175,9 +188,9 @@ class IdempotencyService:
             return "Operation failed"
 
         try:
-            error_data = json.loads(response_data)
+            error_data = orjson.loads(response_data)
             return error_data.get("error", "Operation failed")
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             return "Operation failed"
 
 
@@ -1,87 +1,88 @@
 from datetime import datetime
 from decimal import Decimal
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional, Union
 from uuid import UUID
 
+import sqlalchemy as sa
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession as AsyncSessionType
-from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from app import schemas
 from app.models import Transaction
 from app.repositories.transaction import TransactionRepository
 from app.types import TransactionType
+from app.utils import RedisBalanceCache
+
+
+def calculate_balance_delta(
+    transaction_type: TransactionType, amount: Decimal
+) -> Decimal:
+    """Calculate the signed balance change for a transaction.
+
+    Args:
+        transaction_type: DEPOSIT or WITHDRAW
+        amount: Transaction amount (positive)
+
+    Returns:
+        Decimal: Amount to add to the balance (negative for withdrawals)
+
+    Raises:
+        ValueError: For unknown transaction type
+    """
+    if transaction_type == TransactionType.DEPOSIT:
+        return amount
+
+    if transaction_type == TransactionType.WITHDRAW:
+        return -amount
+
+    raise ValueError(f"Unknown transaction type: {transaction_type}")
 
 
 class TransactionService:
 
-    def __init__(self, session_maker: async_sessionmaker[AsyncSessionType]):
-        self.transaction_repo = TransactionRepository(session_maker=session_maker)
+    def __init__(
+        self,
+        session: AsyncSessionType,
+        balance_cache: Optional[RedisBalanceCache] = None,
+    ):
+        self.transaction_repo = TransactionRepository(session=session)
+        self.balance_cache = balance_cache
 
     async def create_transaction(
-        self, transaction_data: schemas.TransactionCreate
+        self,
+        transaction_data: schemas.TransactionCreate,
+        idempotency_key: Optional[str] = None,
     ) -> schemas.TransactionResponse:
         """Create new transaction with balance calculation.
 
         Args:
             transaction_data: Transaction creation data with user_id, amount, type
+            idempotency_key: Client-supplied idempotency key, if any
 
         Returns:
             TransactionResponse: Created transaction with UID and details
         """
         transaction = (
-            await self.transaction_repo.create_transaction_with_balance_calculation(
-                data=transaction_data, balance_calculator_func=self._calculate_balance
+            await self.transaction_repo.create_transaction_with_balance_update(
+                data=transaction_data,
+                balance_delta=self._calculate_balance_delta(
+                    transaction_data.type, transaction_data.amount
+                ),
+                idempotency_key=idempotency_key,
             )
         )
+        if self.balance_cache is not None:
+            await self.balance_cache.invalidate(transaction_data.user_id)
         return self._build_transaction_response(transaction)
 
-    def _calculate_balance(
-        self,
-        current_balance: Decimal,
-        transaction_type: TransactionType,
-        amount: Decimal,
-    ) -> Decimal:
-        """Calculate new balance based on transaction type.
-
-        Args:
-            current_balance: User's current balance
-            transaction_type: DEPOSIT or WITHDRAW
-            amount: Transaction amount (positive)
-
-        Returns:
-            Decimal: New calculated balance
-
-        Raises:
-            ValueError: For insufficient funds or unknown transaction type
-        """
-        if transaction_type == TransactionType.DEPOSIT:
-            return current_balance + amount
-
-        if transaction_type == TransactionType.WITHDRAW:
-            return self._calculate_withdrawal_balance(current_balance, amount)
-
-        raise ValueError(f"Unknown transaction type: {transaction_type}")
-
-    def _calculate_withdrawal_balance(
-        self, current_balance: Decimal, amount: Decimal
+    def _calculate_balance_delta(
+        self, transaction_type: TransactionType, amount: Decimal
     ) -> Decimal:
-        """Calculate balance for withdrawal with validation.
+        """Calculate the signed balance change for a transaction.
 
-        Args:
-            current_balance: User's current balance
-            amount: Withdrawal amount
-
-        Returns:
-            Decimal: New balance after withdrawal
-
-        Raises:
-            ValueError: If insufficient funds
+        Delegates to :func:`calculate_balance_delta`.
         """
-        new_balance = current_balance - amount
-        if new_balance < 0:
-            raise ValueError("Insufficient funds for withdrawal")
-        return new_balance
+        return calculate_balance_delta(transaction_type, amount)
 
     async def get_transaction(self, transaction_id: str) -> schemas.TransactionResponse:
         """Get transaction by UID.
@@ -95,38 +96,34 @@ class TransactionService:
         Raises:
             HTTPException: 404 if transaction not found
         """
-        transaction = await self.transaction_repo.get_transaction_by_uid(transaction_id)
+        transaction = await self.transaction_repo.get_transaction_row_by_uid(
+            transaction_id
+        )
         if not transaction:
             raise HTTPException(status_code=404, detail="Transaction not found")
         return self._build_transaction_response(transaction)
 
     def _build_transaction_response(
-        self, transaction: Transaction
+        self, transaction: Union[Transaction, sa.Row]
     ) -> schemas.TransactionResponse:
-        """Build transaction response from model.
+        """Build transaction response from model or row.
 
         Args:
-            transaction: Transaction model instance
+            transaction: Transaction model instance or row with its columns
 
         Returns:
             TransactionResponse: Formatted transaction response
         """
-        return schemas.TransactionResponse(
-            uid=transaction.uid,
-            amount=transaction.amount,
-            type=transaction.type,
-            user_id=transaction.user_id,
-            created_at=transaction.created_at,
-        )
+        return schemas.TransactionResponse.from_row(transaction)
 
     async def get_user_balance_at_time(
-        self, user_id: str, timestamp: datetime
+        self, user_id: str, timestamp: Optional[datetime] = None
     ) -> Decimal:
         """Calculate user balance at specific timestamp.
 
         Args:
             user_id: User UUID string
-            timestamp: Target datetime for balance calculation
+            timestamp: Target datetime for balance calculation; None means now
 
         Returns:
             Decimal: User balance at specified time
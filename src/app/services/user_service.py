@@ -1,19 +1,31 @@
 import logging
-from typing import Optional
+from decimal import Decimal
+from typing import Any, Dict, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession as AsyncSessionType
-from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from app import schemas
 from app.models import User
 from app.repositories.user import UserRepository
+from app.utils import RedisBalanceCache, TTLCache, normalize_user_id
 
 logger = logging.getLogger(__name__)
 
+# Short-lived per-process cache of the immutable user fields for repeated
+# GET /users/{id} polling, keyed by normalized user id. The balance is never
+# stored here: it is read through get_user_balance, so every worker sees the
+# same value as /balance.
+USER_CACHE = TTLCache(maxsize=10_000, ttl_seconds=5.0)
+
 
 class UserService:
-    def __init__(self, session_maker: async_sessionmaker[AsyncSessionType]):
-        self.user_repo = UserRepository(session_maker=session_maker)
+    def __init__(
+        self,
+        session: AsyncSessionType,
+        balance_cache: Optional[RedisBalanceCache] = None,
+    ):
+        self.user_repo = UserRepository(session=session)
+        self.balance_cache = balance_cache
 
     async def create_user(self, data: schemas.UserCreate) -> User:
         """Create a new user with zero balance.
@@ -36,3 +48,49 @@ class UserService:
             Optional[User]: User instance if found, None otherwise
         """
         return await self.user_repo.get_user_by_id(user_id)
+
+    async def get_user_dict_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieve user fields as a plain dict.
+
+        Name and creation time come from the process-local cache when present;
+        the balance always goes through :meth:`get_user_balance`.
+
+        Args:
+            user_id: User UUID string
+
+        Returns:
+            Optional[Dict[str, Any]]: User fields if found, None otherwise
+        """
+        cache_key = normalize_user_id(user_id)
+        profile = USER_CACHE.get(cache_key)
+        if profile is None:
+            user = await self.user_repo.get_user_dict_by_id(user_id)
+            if user is not None:
+                USER_CACHE.set(
+                    cache_key, {k: v for k, v in user.items() if k != "balance"}
+                )
+            return user
+
+        balance = await self.get_user_balance(user_id)
+        if balance is None:
+            return None
+        return {**profile, "balance": balance}
+
+    async def get_user_balance(self, user_id: str) -> Optional[Decimal]:
+        """Retrieve the current balance of a user.
+
+        Args:
+            user_id: User UUID string
+
+        Returns:
+            Optional[Decimal]: Current balance if user exists, None otherwise
+        """
+        if self.balance_cache is None:
+            return await self.user_repo.get_user_balance(user_id)
+
+        balance = await self.balance_cache.get(user_id)
+        if balance is None:
+            balance = await self.user_repo.get_user_balance(user_id)
+            if balance is not None:
+                await self.balance_cache.set(user_id, balance)
+        return balance
@@ -14,6 +14,16 @@ class Settings(pydantic_settings.BaseSettings):
     db_user: str = "postgres"
     db_password: str = "password"
     db_database: str = "postgres"
+    db_pool_size: int = 20
+    db_max_overflow: int = 40
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_warmup: int = 0
+    db_pool_pre_ping: bool = True
+    # Writes give up on a contended row lock after this long (0 waits forever)
+    db_lock_timeout_ms: int = 1000
+    # asyncpg prepared statements kept per connection
+    db_statement_cache_size: int = 500
 
     app_port: int = 8000
 
@@ -22,6 +32,10 @@ class Settings(pydantic_settings.BaseSettings):
     redis_port: int = 6379
     redis_db: int = 0
     redis_password: str | None = None
+    # Connections per Redis client pool; requests wait when all are busy
+    redis_max_connections: int = 64
+    # Lifetime of cached current balances; 0 disables the cache
+    balance_cache_ttl_ms: int = 500
 
     @property
     def redis_url(self) -> str:
@@ -2,19 +2,133 @@
 Utility classes and functions for the application.
 """
 
-import json
 import logging
+import time
 from datetime import datetime, timezone
+from decimal import Decimal
 from enum import Enum
-from typing import Any, Dict, Optional
-from uuid import uuid4
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID, uuid4
 
+import orjson
 import redis.asyncio as redis
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, Field, TypeAdapter
+from redis.commands.core import AsyncScript
 
 logger = logging.getLogger(__name__)
 
 
+def _connect(
+    redis_url: str, max_connections: int, decode_responses: bool = True
+) -> redis.Redis:
+    """Create a client over a bounded connection pool.
+
+    Concurrent commands run on separate pooled connections; once
+    ``max_connections`` are busy, callers wait for one to be released instead
+    of opening more.
+    """
+    pool = redis.BlockingConnectionPool.from_url(
+        redis_url, max_connections=max_connections, decode_responses=decode_responses
+    )
+    return redis.Redis.from_pool(pool)
+
+
+def _record_key(key: str) -> bytes:
+    """Build the Redis key of an idempotency record.
+
+    Keys are sent as bytes, which redis-py passes through without re-encoding.
+    """
+    return b"idempotency:" + key.encode()
+
+
+def normalize_user_id(user_id: str) -> str:
+    """Return the canonical spelling of a user id, for use in cache keys.
+
+    Postgres compares ids as native UUIDs, so differently cased spellings name
+    the same user and must share a cache entry. Malformed ids are returned
+    unchanged.
+
+    Args:
+        user_id: User id as received from the client
+
+    Returns:
+        str: Lowercase hyphenated UUID, or the id itself if it is not a UUID
+    """
+    try:
+        return str(UUID(user_id))
+    except ValueError:
+        return user_id
+
+
+def _balance_key(user_id: str) -> str:
+    """Build the Redis key of a cached balance."""
+    return f"balance:{normalize_user_id(user_id)}"
+
+
+def _utcnow() -> datetime:
+    """Return the current time in UTC."""
+    return datetime.now(timezone.utc)
+
+
+def _encode(value: Any) -> bytes:
+    """Serialize a value to JSON bytes, stringifying unsupported types.
+
+    orjson handles datetimes and UUIDs natively; the ``str`` fallback only runs
+    for the rest, e.g. Decimals.
+    """
+    return orjson.dumps(value, default=str)
+
+
+def _dumps(value: Any) -> str:
+    """Serialize a value to a JSON string, stringifying unsupported types."""
+    return _encode(value).decode()
+
+
+class TTLCache:
+    """Small in-process cache with per-entry expiry and bounded size.
+
+    Not shared between worker processes; entries may be stale for up to
+    ``ttl_seconds`` after a write handled by another worker.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl_seconds: float = 5.0):
+        """Initialize cache.
+
+        Args:
+            maxsize: Maximum number of entries kept; oldest are evicted first
+            ttl_seconds: Lifetime of each entry in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data: Dict[Any, Tuple[float, Any]] = {}
+
+    def get(self, key: Any) -> Optional[Any]:
+        """Return cached value, or None if missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key: Any, value: Any) -> None:
+        """Store a value, evicting the oldest entry when full."""
+        self._data.pop(key, None)
+        if len(self._data) >= self.maxsize:
+            del self._data[next(iter(self._data))]
+        self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def invalidate(self, key: Any) -> None:
+        """Drop a cached value if present."""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all cached values."""
+        self._data.clear()
+
+
 class IdempotencyStatus(Enum):
     """Status of idempotency request processing."""
 
@@ -26,8 +140,6 @@ class IdempotencyStatus(Enum):
 class IdempotencyRecord(BaseModel):
     """Pydantic model for idempotency record."""
 
-    model_config = ConfigDict(json_encoders={datetime: lambda v: v.isoformat()})
-
     idempotency_key: str = Field(..., description="Unique idempotency key")
     status: IdempotencyStatus = Field(
         default=IdempotencyStatus.IN_PROCESS, description="Status of the operation"
@@ -35,32 +147,80 @@ class IdempotencyRecord(BaseModel):
     response_data: Optional[str] = Field(
         default=None, description="Cached response data (JSON string)"
     )
+    schema_name: Optional[str] = Field(
+        default=None, description="Name of the model the response data encodes"
+    )
     created_at: datetime = Field(
-        default_factory=lambda: datetime.now(timezone.utc),
-        description="Record creation timestamp",
+        default_factory=_utcnow, description="Record creation timestamp"
     )
+    # Defaults to created_at, so a new record reads the clock only once
     updated_at: datetime = Field(
-        default_factory=lambda: datetime.now(timezone.utc),
+        default_factory=lambda data: data["created_at"],
         description="Record last update timestamp",
     )
     ttl: int = Field(default=3600, description="Time to live in seconds")
 
+    def to_json(self) -> str:
+        """Serialize the record for Redis, omitting fields left at their defaults.
+
+        Validation restores omitted fields, so stored records stay small and
+        records written in full still load.
+        """
+        return self.model_dump_json(exclude_defaults=True)
+
+
+# Validates stored records with less per-call dispatch than model_validate_json
+_RECORD_ADAPTER: TypeAdapter[IdempotencyRecord] = TypeAdapter(IdempotencyRecord)
+
+
+# Completes the stored record in place, keeping its other fields: sets status
+# ARGV[2], response data ARGV[3], schema name ARGV[4] (empty strings clear them)
+# and updated_at ARGV[5], then a TTL of ARGV[1] seconds. Returns 1 when done,
+# 0 when the key is missing and -1 when the record is not valid JSON.
+_COMPLETE_LUA = """
+local existing = redis.call('GET', KEYS[1])
+if not existing then
+    return 0
+end
+local ok, record = pcall(cjson.decode, existing)
+if not ok or type(record) ~= 'table' then
+    return -1
+end
+record['status'] = ARGV[2]
+record['response_data'] = ARGV[3] ~= '' and ARGV[3] or nil
+record['schema_name'] = ARGV[4] ~= '' and ARGV[4] or nil
+record['updated_at'] = ARGV[5]
+redis.call('SET', KEYS[1], cjson.encode(record), 'EX', ARGV[1])
+return 1
+"""
+
 
 class RedisIdempotencyStorage:
     """Redis-based storage for idempotency keys with TTL support."""
 
     def __init__(
-        self, redis_url: str = "redis://localhost:6379", default_ttl_seconds: int = 3600
+        self,
+        redis_url: str = "redis://localhost:6379",
+        default_ttl_seconds: int = 3600,
+        max_connections: int = 64,
+        local_ttl_seconds: float = 1.0,
     ):
         """Initialize Redis storage.
 
         Args:
             redis_url: Redis connection URL
             default_ttl_seconds: Default TTL for stored items in seconds
+            max_connections: Size of the Redis connection pool
+            local_ttl_seconds: How long this process reuses records it completed
         """
         self.redis_url = redis_url
         self.default_ttl_seconds = default_ttl_seconds
+        self.max_connections = max_connections
+        # Completed records are final, so retries of a key this process just
+        # finished can be answered without a Redis round-trip
+        self._completed = TTLCache(ttl_seconds=local_ttl_seconds)
         self._redis: Optional[redis.Redis] = None
+        self._complete_script: Optional[AsyncScript] = None
 
     async def _get_redis(self) -> redis.Redis:
         """Get or create Redis connection.
@@ -69,7 +229,11 @@ class RedisIdempotencyStorage:
             redis.Redis: Redis connection instance
         """
         if self._redis is None:
-            self._redis = redis.from_url(self.redis_url, decode_responses=True)
+            # Values are JSON parsed straight from bytes, so responses are not
+            # decoded to str first
+            self._redis = _connect(
+                self.redis_url, self.max_connections, decode_responses=False
+            )
         return self._redis
 
     async def set(
@@ -84,12 +248,13 @@ class RedisIdempotencyStorage:
         """
         ttl = ttl_seconds or self.default_ttl_seconds
         redis_client = await self._get_redis()
+        self._completed.invalidate(key)
 
-        # Serialize value to JSON
-        serialized_value = json.dumps(value, default=str)
+        # Serialize value to JSON bytes, sent to Redis without decoding
+        serialized_value = _encode(value)
 
         await redis_client.setex(
-            name=f"idempotency:{key}", time=ttl, value=serialized_value
+            name=_record_key(key), time=ttl, value=serialized_value
         )
 
     async def get(self, key: str) -> Optional[Any]:
@@ -103,13 +268,13 @@ class RedisIdempotencyStorage:
         """
         redis_client = await self._get_redis()
 
-        serialized_value = await redis_client.get(f"idempotency:{key}")
+        serialized_value = await redis_client.get(_record_key(key))
         if serialized_value is None:
             return None
 
         try:
-            return json.loads(serialized_value)
-        except json.JSONDecodeError:
+            return orjson.loads(serialized_value)
+        except orjson.JSONDecodeError:
             logger.warning(f"Failed to deserialize value for key {key}")
             return None
 
@@ -123,7 +288,8 @@ class RedisIdempotencyStorage:
             True if key was deleted, False if key didn't exist
         """
         redis_client = await self._get_redis()
-        deleted_count = await redis_client.delete(f"idempotency:{key}")
+        self._completed.invalidate(key)
+        deleted_count = await redis_client.delete(_record_key(key))
         return deleted_count > 0
 
     async def exists(self, key: str) -> bool:
@@ -136,66 +302,83 @@ class RedisIdempotencyStorage:
             True if key exists, False otherwise
         """
         redis_client = await self._get_redis()
-        return await redis_client.exists(f"idempotency:{key}") > 0
+        return await redis_client.exists(_record_key(key)) > 0
 
     async def close(self) -> None:
         """Close Redis connection. Call during application shutdown."""
         if self._redis:
             await self._redis.aclose()
             self._redis = None
+            self._complete_script = None
 
-    async def start_idempotent_operation(
-        self, key: str, ttl_seconds: Optional[int] = None
-    ) -> bool:
-        """Start an idempotent operation by setting IN_PROCESS status.
+    async def get_idempotency_record(self, key: str) -> Optional[IdempotencyRecord]:
+        """Get idempotency record with full status information.
 
         Args:
             key: Idempotency key
-            ttl_seconds: TTL in seconds, uses default if None
 
         Returns:
-            bool: True if operation started (key didn't exist),
-                  False if already exists (duplicate request)
+            IdempotencyRecord: Record if exists, None otherwise
         """
-        ttl = ttl_seconds or self.default_ttl_seconds
+        completed_record = self._completed.get(key)
+        if completed_record is not None:
+            return completed_record
+
         redis_client = await self._get_redis()
 
-        # Create initial record with IN_PROCESS status
-        record = IdempotencyRecord(
-            idempotency_key=key, status=IdempotencyStatus.IN_PROCESS
-        )
-        serialized_record = record.model_dump_json()
-
-        # Use Redis SET with NX (only if not exists) to prevent race conditions
-        result = await redis_client.set(
-            f"idempotency:{key}",
-            serialized_record,
-            ex=ttl,
-            nx=True,  # Only set if key doesn't exist
-        )
+        serialized_record = await redis_client.get(_record_key(key))
+        return self._deserialize_record(key, serialized_record)
 
-        return (
-            result is not None
-        )  # Returns True if key was set, False if already exists
+    async def begin_or_get(
+        self, key: str, ttl_seconds: Optional[int] = None
+    ) -> Tuple[bool, Optional[IdempotencyRecord]]:
+        """Claim an idempotency key or fetch the record already holding it.
 
-    async def get_idempotency_record(self, key: str) -> Optional[IdempotencyRecord]:
-        """Get idempotency record with full status information.
+        A single ``SET ... NX GET`` stores the new IN_PROCESS record only if the
+        key is absent and returns the record already there otherwise, atomically
+        and in one round-trip (Redis 7+). A record this process completed
+        moments ago is returned without calling Redis.
 
         Args:
             key: Idempotency key
+            ttl_seconds: TTL in seconds, uses default if None
 
         Returns:
-            IdempotencyRecord: Record if exists, None otherwise
+            Tuple[bool, Optional[IdempotencyRecord]]: ``(True, record)`` with the
+                new IN_PROCESS record if the key was claimed, otherwise
+                ``(False, record)`` with the existing record (None if it could
+                not be decoded)
         """
+        completed_record = self._completed.get(key)
+        if completed_record is not None:
+            return False, completed_record
+
+        ttl = ttl_seconds or self.default_ttl_seconds
         redis_client = await self._get_redis()
 
-        serialized_record = await redis_client.get(f"idempotency:{key}")
+        record = IdempotencyRecord(
+            idempotency_key=key, status=IdempotencyStatus.IN_PROCESS
+        )
+        serialized_record = await redis_client.set(
+            _record_key(key), record.to_json(), ex=ttl, nx=True, get=True
+        )
+
+        if serialized_record is None:
+            return True, record
+
+        return False, self._deserialize_record(key, serialized_record)
+
+    @staticmethod
+    def _deserialize_record(
+        key: str, serialized_record: Optional[bytes]
+    ) -> Optional[IdempotencyRecord]:
+        """Parse a stored idempotency record, returning None if absent or invalid."""
         if serialized_record is None:
             return None
 
         try:
-            return IdempotencyRecord.model_validate_json(serialized_record)
-        except (json.JSONDecodeError, ValueError) as e:
+            return _RECORD_ADAPTER.validate_json(serialized_record)
+        except (orjson.JSONDecodeError, ValueError) as e:
             logger.warning(
                 f"Failed to deserialize idempotency record for key {key}: {e}"
             )
@@ -208,15 +391,26 @@ class RedisIdempotencyStorage:
         data: Optional[Dict[str, Any]] = None,
         error: Optional[str] = None,
         ttl_seconds: Optional[int] = None,
+        created_at: Optional[datetime] = None,
+        data_json: Optional[str] = None,
+        schema_name: Optional[str] = None,
     ) -> bool:
         """Complete an idempotent operation with success or failure status.
 
+        When ``created_at`` is known (e.g. from :meth:`begin_or_get`) the record
+        is overwritten with a single ``SET ... XX EX``; otherwise a Lua script
+        updates the stored record in place, keeping its creation timestamp,
+        atomically and in a single round-trip.
+
         Args:
             key: Idempotency key
             success: True for success, False for failure
             data: Response data for successful operations
             error: Error message for failed operations
             ttl_seconds: TTL in seconds, uses default if None
+            created_at: Creation timestamp of the IN_PROCESS record, if known
+            data_json: Already serialized response data, stored as is
+            schema_name: Name of the model ``data_json`` encodes
 
         Returns:
             bool: True if operation was completed, False if key didn't exist
@@ -224,42 +418,140 @@ class RedisIdempotencyStorage:
         ttl = ttl_seconds or self.default_ttl_seconds
         redis_client = await self._get_redis()
 
-        # Get existing record to preserve created_at
-        serialized_existing = await redis_client.get(f"idempotency:{key}")
-        if serialized_existing is None:
+        # Update record with completion status
+        status = IdempotencyStatus.SUCCESS if success else IdempotencyStatus.FAILURE
+
+        # Prepare response data with Decimal handling
+        if success:
+            response_data = data_json or (_dumps(data) if data else None)
+        else:
+            response_data = _dumps({"error": error}) if error else None
+
+        if created_at is None:
+            if self._complete_script is None:
+                self._complete_script = redis_client.register_script(_COMPLETE_LUA)
+            result = await self._complete_script(
+                keys=[_record_key(key)],
+                args=[
+                    ttl,
+                    status.value,
+                    response_data or "",
+                    schema_name or "",
+                    _utcnow().isoformat(),
+                ],
+            )
+            if result < 0:
+                logger.warning(f"Failed to deserialize existing record for key {key}")
+                return False
+        else:
+            completed_record = IdempotencyRecord(
+                idempotency_key=key,
+                status=status,
+                response_data=response_data,
+                schema_name=schema_name,
+                created_at=created_at,
+                updated_at=_utcnow(),
+            )
+
+            # Overwrite only if the IN_PROCESS record still exists
+            result = await redis_client.set(
+                _record_key(key), completed_record.to_json(), ex=ttl, xx=True
+            )
+            if result:
+                self._completed.set(key, completed_record)
+
+        if not result:
             logger.warning(
                 f"Attempted to complete non-existent idempotency operation: {key}"
             )
             return False
 
-        try:
-            existing_record = IdempotencyRecord.model_validate_json(serialized_existing)
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.warning(f"Failed to deserialize existing record for key {key}: {e}")
-            return False
+        return True
 
-        # Update record with completion status
-        status = IdempotencyStatus.SUCCESS if success else IdempotencyStatus.FAILURE
 
-        # Prepare response data with Decimal handling
-        if success:
-            response_data = json.dumps(data, default=str) if data else None
-        else:
-            response_data = json.dumps({"error": error}, default=str) if error else None
+class RedisBalanceCache:
+    """Short-lived Redis cache of current user balances, shared by all workers.
 
-        completed_record = IdempotencyRecord(
-            idempotency_key=key,
-            status=status,
-            response_data=response_data,
-            created_at=existing_record.created_at,
-        )
+    Entries are dropped after every balance change; a read racing a write may
+    still cache the old balance, but only for ``ttl_ms``. Redis errors are
+    logged and treated as misses so the database stays the source of truth.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = "redis://localhost:6379",
+        ttl_ms: int = 500,
+        max_connections: int = 64,
+    ):
+        """Initialize balance cache.
+
+        Args:
+            redis_url: Redis connection URL
+            ttl_ms: Lifetime of cached balances in milliseconds
+            max_connections: Size of the Redis connection pool
+        """
+        self.redis_url = redis_url
+        self.ttl_ms = ttl_ms
+        self.max_connections = max_connections
+        self._redis: Optional[redis.Redis] = None
+
+    async def _get_redis(self) -> redis.Redis:
+        """Get or create Redis connection.
+
+        Returns:
+            redis.Redis: Redis connection instance
+        """
+        if self._redis is None:
+            self._redis = _connect(self.redis_url, self.max_connections)
+        return self._redis
 
-        serialized_record = completed_record.model_dump_json()
+    async def get(self, user_id: str) -> Optional[Decimal]:
+        """Get the cached balance of a user.
 
-        # Update the record
-        await redis_client.setex(f"idempotency:{key}", ttl, serialized_record)
+        Args:
+            user_id: User UUID string
 
-        return True
+        Returns:
+            Optional[Decimal]: Cached balance, None on miss or Redis error
+        """
+        try:
+            redis_client = await self._get_redis()
+            value = await redis_client.get(_balance_key(user_id))
+        except redis.RedisError as e:
+            logger.warning(f"Balance cache read failed for {user_id}: {e}")
+            return None
+        return Decimal(value) if value is not None else None
+
+    async def set(self, user_id: str, balance: Decimal) -> None:
+        """Cache the balance of a user for ``ttl_ms``.
+
+        Args:
+            user_id: User UUID string
+            balance: Current balance
+        """
+        try:
+            redis_client = await self._get_redis()
+            await redis_client.set(_balance_key(user_id), str(balance), px=self.ttl_ms)
+        except redis.RedisError as e:
+            logger.warning(f"Balance cache write failed for {user_id}: {e}")
+
+    async def invalidate(self, user_id: str) -> None:
+        """Drop the cached balance of a user.
+
+        Args:
+            user_id: User UUID string
+        """
+        try:
+            redis_client = await self._get_redis()
+            await redis_client.delete(_balance_key(user_id))
+        except redis.RedisError as e:
+            logger.warning(f"Balance cache invalidation failed for {user_id}: {e}")
+
+    async def close(self) -> None:
+        """Close Redis connection. Call during application shutdown."""
+        if self._redis:
+            await self._redis.aclose()
+            self._redis = None
 
 
 # Global storage instance
@@ -267,12 +559,13 @@ _idempotency_storage: Optional[RedisIdempotencyStorage] = None
 
 
 def get_idempotency_storage(
-    redis_url: str = "redis://localhost:6379",
+    redis_url: str = "redis://localhost:6379", max_connections: int = 64
 ) -> RedisIdempotencyStorage:
     """Get the global idempotency storage instance.
 
     Args:
         redis_url: Redis connection URL
+        max_connections: Size of the Redis connection pool
 
     Returns:
         RedisIdempotencyStorage: Redis storage instance
@@ -280,7 +573,9 @@ def get_idempotency_storage(
     global _idempotency_storage
 
     if _idempotency_storage is None:
-        _idempotency_storage = RedisIdempotencyStorage(redis_url)
+        _idempotency_storage = RedisIdempotencyStorage(
+            redis_url, max_connections=max_connections
+        )
         logger.info("Using Redis for idempotency storage")
 
     return _idempotency_storage
@@ -2,61 +2,106 @@
 Common test fixtures and configuration for pytest.
 """
 
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from decimal import Decimal
+from typing import Any, Iterator
 from unittest.mock import AsyncMock, MagicMock, Mock
 from uuid import uuid4
 
 import pytest
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+import uvloop
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import schemas
 from app.models import Transaction, User
 from app.types import TransactionType
 
 
-@pytest.fixture
-def mock_db_session():
-    """Mock database session for testing."""
+@pytest.fixture(scope="session")
+def event_loop_policy() -> uvloop.EventLoopPolicy:
+    """Run async tests on uvloop, the loop the service itself runs on."""
+    return uvloop.EventLoopPolicy()
+
+
+@asynccontextmanager
+async def _null_transaction():
+    """Stand-in for ``session.begin()``; entering it returns nothing."""
+    yield None
+
+
+def reset_shared_mock(mock: Mock) -> None:
+    """Reset a shared mock between tests; see ``shared_mock_fixture``.
+
+    Args:
+        mock: Shared mock to reset
+    """
+    mock.reset_mock(return_value=True, side_effect=True)
+
+
+def shared_mock_fixture(mock: Mock) -> Any:
+    """Build a fixture that yields ``mock`` to every test, reset after each.
+
+    Constructing an AsyncMock (a spec'd one especially) is far slower than
+    awaiting one, so test modules build their mocks once and share them.
+    ``reset_mock`` clears calls, return values and side effects, but does NOT
+    undo attributes assigned directly on the mock (``mock.set = AsyncMock()``);
+    those leak into later tests. Tests must configure shared mocks through
+    ``return_value`` and ``side_effect`` only, and any attribute that needs a
+    different mock type is assigned once, where the shared mock is built.
+
+    Args:
+        mock: Mock shared by the tests; the fixture takes the name it is
+            assigned to in the test module
+
+    Returns:
+        Any: Fixture function
+    """
+
+    @pytest.fixture
+    def _shared_mock() -> Iterator[Mock]:
+        yield mock
+        reset_shared_mock(mock)
+
+    return _shared_mock
+
+
+def _wire_mock_db_session(session: AsyncMock) -> None:
+    """Configure the context-manager behaviour of a mock session."""
+    session.__aenter__.return_value = session
+    # begin() must be a plain callable returning a fresh async context manager
+    session.begin.side_effect = _null_transaction
+
+
+@pytest.fixture(scope="session")
+def _mock_db_session_graph() -> AsyncMock:
+    """Build the mock session once; constructing AsyncMocks is slow."""
     session = AsyncMock(spec=AsyncSession)
     session.execute = AsyncMock()
     session.flush = AsyncMock()
     session.refresh = AsyncMock()
     session.add = MagicMock()
-    session.begin = AsyncMock()
     session.commit = AsyncMock()
     session.rollback = AsyncMock()
-    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aenter__ = AsyncMock()
     session.__aexit__ = AsyncMock()
+    session.begin = Mock()  # Use regular Mock, not AsyncMock
 
-    # Mock begin() context manager - must be callable that returns an async context manager
-    begin_mock = AsyncMock()
-    begin_mock.__aenter__ = AsyncMock(
-        return_value=None
-    )  # begin() doesn't return anything on __aenter__
-    begin_mock.__aexit__ = AsyncMock(return_value=None)
-    session.begin = Mock(return_value=begin_mock)  # Use regular Mock, not AsyncMock
-
+    _wire_mock_db_session(session)
     return session
 
 
 @pytest.fixture
-def mock_session_maker(mock_db_session):
-    """Mock session maker that returns mocked session with proper async context manager."""
-    session_maker = MagicMock(spec=async_sessionmaker)
-
-    # Create an async context manager that returns the mock session
-    async_context = AsyncMock()
-    async_context.__aenter__ = AsyncMock(return_value=mock_db_session)
-    async_context.__aexit__ = AsyncMock()
+def mock_db_session(_mock_db_session_graph):
+    """Mock database session for testing, reset after each test."""
+    session = _mock_db_session_graph
+    yield session
 
-    # Make session_maker() return the async context manager
-    session_maker.return_value = async_context
+    reset_shared_mock(session)
+    _wire_mock_db_session(session)
 
-    return session_maker
 
-
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_user():
     """Sample user instance for testing."""
     return User(
@@ -67,28 +112,25 @@ def sample_user():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_transaction():
     """Sample transaction instance for testing."""
-    transaction = Transaction(
+    return Transaction(
         uid="test-transaction-123",
         type=TransactionType.DEPOSIT,
         amount=Decimal("50.00"),
         user_id="test-user-123",
         created_at=datetime.now(timezone.utc),
     )
-    # Add balance_after as runtime attribute
-    transaction.balance_after = Decimal("150.00")
-    return transaction
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_user_create():
     """Sample user creation data."""
     return schemas.UserCreate(name="John Doe")
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_transaction_create():
     """Sample transaction creation data."""
     return schemas.TransactionCreate(
@@ -96,7 +138,7 @@ def sample_transaction_create():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_withdrawal_create():
     """Sample withdrawal transaction creation data."""
     return schemas.TransactionCreate(
@@ -116,6 +158,12 @@ class MockSQLAlchemyResult:
     def scalar(self):
         return self.return_value
 
+    def one_or_none(self):
+        return self.return_value
+
+    def one(self):
+        return self.return_value
+
 
 @pytest.fixture
 def mock_result():
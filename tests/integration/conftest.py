@@ -5,7 +5,7 @@ Integration test configuration and fixtures.
 import asyncio
 import os
 from decimal import Decimal
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Generator
 
 import pytest
 import pytest_asyncio
@@ -13,9 +13,15 @@ import redis.asyncio as redis
 import sqlalchemy as sa
 from fastapi import FastAPI
 from httpx import AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-from app.api.base import get_db, get_settings
+from app.api.base import clear_idempotency_caches, get_db, get_settings
 from app.application import AppBuilder
 from app.models import Base, Transaction, User
 from app.settings import Settings
@@ -40,9 +46,16 @@ class TestSettings(Settings):
     redis_db: int = 1  # Use different Redis DB for tests
 
 
-@pytest_asyncio.fixture
-async def test_redis_client() -> AsyncGenerator[redis.Redis, None]:
-    """Create a test Redis client that's properly managed for each test."""
+# Connections kept open by the shared test engine
+TEST_DB_POOL_SIZE = 5
+
+# Key patterns written by the application during tests
+TEST_REDIS_KEY_PATTERNS = ("idempotency:*", "balance:*")
+
+
+@pytest_asyncio.fixture(scope="session")
+async def shared_redis_client() -> AsyncGenerator[redis.Redis, None]:
+    """Create one test Redis client for the whole run."""
     # Use test Redis configuration
     redis_url = f"redis://{os.getenv('REDIS_HOST', 'localhost')}:6379/1"
 
@@ -52,17 +65,35 @@ async def test_redis_client() -> AsyncGenerator[redis.Redis, None]:
         # Test connection
         await redis_client.ping()
 
-        # Clear any existing data in test Redis DB
+        # Start from an empty test Redis DB
         await redis_client.flushdb()
 
         yield redis_client
 
     finally:
-        # Clean up: clear test data and close connection
         await redis_client.flushdb()
         await redis_client.aclose()
 
 
+@pytest_asyncio.fixture
+async def test_redis_client(
+    shared_redis_client: redis.Redis,
+) -> AsyncGenerator[redis.Redis, None]:
+    """Provide the shared Redis client, deleting the keys a test wrote after it."""
+    yield shared_redis_client
+
+    keys = [
+        key
+        for pattern in TEST_REDIS_KEY_PATTERNS
+        async for key in shared_redis_client.scan_iter(match=pattern, count=500)
+    ]
+    if keys:
+        async with shared_redis_client.pipeline(transaction=False) as pipe:
+            for start in range(0, len(keys), 500):
+                pipe.unlink(*keys[start : start + 500])
+            await pipe.execute()
+
+
 @pytest_asyncio.fixture
 async def test_idempotency_storage(
     test_redis_client: redis.Redis,
@@ -74,18 +105,30 @@ async def test_idempotency_storage(
     return storage
 
 
-@pytest_asyncio.fixture
-async def test_engine():
-    """Create test database engine for each test."""
+@pytest_asyncio.fixture(scope="session")
+async def schema_engine():
+    """Create the test database engine and schema once for the whole run."""
     engine = create_async_engine(
         TEST_DATABASE_URL,
         echo=False,  # Set to True for SQL debugging
-        pool_pre_ping=True,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=TEST_DB_POOL_SIZE,
+        max_overflow=10,
+        # The test database lives as long as the run, so skip the per-checkout ping
+        pool_pre_ping=False,
     )
     # Create tables
     async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
 
+    # Open the pool's connections up front so the first requests don't pay
+    # for the handshakes
+    connections = await asyncio.gather(
+        *(engine.connect() for _ in range(TEST_DB_POOL_SIZE))
+    )
+    await asyncio.gather(*(conn.close() for conn in connections))
+
     yield engine
 
     # Clean up: Drop all tables and dispose engine
@@ -94,6 +137,20 @@ async def test_engine():
     await engine.dispose()
 
 
+@pytest_asyncio.fixture
+async def test_engine(schema_engine):
+    """Provide the shared engine, emptying every table after each test.
+
+    Tests commit through several sessions and connections, so isolation comes
+    from truncating the tables rather than rolling back one transaction.
+    """
+    yield schema_engine
+
+    table_names = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    async with schema_engine.begin() as conn:
+        await conn.execute(sa.text(f"TRUNCATE TABLE {table_names} CASCADE"))
+
+
 @pytest_asyncio.fixture
 async def db_session(test_engine) -> AsyncGenerator[AsyncSession, None]:
     """Create a database session for testing."""
@@ -107,61 +164,120 @@ async def db_session(test_engine) -> AsyncGenerator[AsyncSession, None]:
         await session.rollback()
 
 
+@pytest_asyncio.fixture(scope="session")
+async def outer_connection(schema_engine) -> AsyncGenerator[AsyncConnection, None]:
+    """Hold one connection in a transaction that is never committed."""
+    async with schema_engine.connect() as conn:
+        transaction = await conn.begin()
+        yield conn
+        await transaction.rollback()
+
+
 @pytest_asyncio.fixture
-async def app(
-    test_engine, test_idempotency_storage: RedisIdempotencyStorage
-) -> AsyncGenerator[FastAPI, None]:
-    """Create FastAPI application for testing."""
-    # Import here to avoid circular imports
-    from app.utils import reset_idempotency_storage, set_test_idempotency_storage
+async def savepoint_session(
+    outer_connection: AsyncConnection,
+) -> AsyncGenerator[AsyncSession, None]:
+    """Create a session whose work is rolled back to a SAVEPOINT after the test.
+
+    Commits inside the test only release the session's own savepoints, so no
+    test data is ever committed. Nothing written here is visible to other
+    connections, so tests that go through the application must use
+    ``db_session`` instead.
+    """
+    savepoint = await outer_connection.begin_nested()
+    session = AsyncSession(
+        bind=outer_connection,
+        expire_on_commit=False,
+        join_transaction_mode="create_savepoint",
+    )
+    try:
+        yield session
+    finally:
+        await session.close()
+        await savepoint.rollback()
 
-    # Set the global test storage
-    set_test_idempotency_storage(test_idempotency_storage)
 
-    # Create app builder and get app
-    app_builder = AppBuilder()
-    app = app_builder.app
+@pytest.fixture(scope="session")
+def shared_app(schema_engine) -> Generator[FastAPI, None, None]:
+    """Build the FastAPI application once, wired to the test database.
+
+    The overridden dependencies are the same for every test, so they are
+    installed once here rather than per test.
+    """
+    app = AppBuilder().app
 
     # Create test settings
     test_settings = TestSettings()
 
-    # Override dependency to return test session maker
-    def get_test_session_maker():
-        return async_sessionmaker(
-            test_engine, class_=AsyncSession, expire_on_commit=False
-        )
+    # Override dependency to yield a request-scoped test session
+    session_maker = async_sessionmaker(
+        schema_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def get_test_session():
+        async with session_maker() as session:
+            yield session
 
     # Override settings dependency
     def get_test_settings():
         return test_settings
 
-    app.dependency_overrides[get_db] = get_test_session_maker
+    app.dependency_overrides[get_db] = get_test_session
     app.dependency_overrides[get_settings] = get_test_settings
 
     yield app
 
+    app.dependency_overrides.clear()
+
+
+@pytest_asyncio.fixture
+async def app(
+    shared_app: FastAPI,
+    test_engine,
+    test_idempotency_storage: RedisIdempotencyStorage,
+) -> AsyncGenerator[FastAPI, None]:
+    """Point the shared application at this test's Redis and clean tables after."""
+    # Import here to avoid circular imports
+    from app.utils import reset_idempotency_storage, set_test_idempotency_storage
+
+    # Set the global test storage and drop instances cached by earlier tests
+    set_test_idempotency_storage(test_idempotency_storage)
+    await clear_idempotency_caches()
+
+    yield shared_app
+
     # Clean up: reset global storage
     reset_idempotency_storage()
+    await clear_idempotency_caches()
 
 
-@pytest_asyncio.fixture
-async def client(app: FastAPI) -> AsyncGenerator[AsyncClient, None]:
-    """Create HTTP client for API testing."""
+@pytest_asyncio.fixture(scope="session")
+async def shared_client(shared_app: FastAPI) -> AsyncGenerator[AsyncClient, None]:
+    """Create one HTTP client over the shared application for the whole run."""
     from httpx import ASGITransport
 
     async with AsyncClient(
-        transport=ASGITransport(app=app), base_url="http://test"
+        transport=ASGITransport(app=shared_app), base_url="http://test"
     ) as client:
         yield client
 
 
+@pytest_asyncio.fixture
+async def client(app: FastAPI, shared_client: AsyncClient) -> AsyncClient:
+    """HTTP client for API testing, with this test's overrides in place."""
+    return shared_client
+
+
+# Inserts read generated ids and computed columns back via RETURNING, and
+# sessions do not expire on commit, so fixtures need no refresh() round trips
+
+
 @pytest_asyncio.fixture
 async def sample_user(db_session: AsyncSession) -> User:
     """Create a sample user in the database."""
     user = User(name="John Doe", balance=Decimal("100.00"))
     db_session.add(user)
     await db_session.commit()
-    await db_session.refresh(user)
     return user
 
 
@@ -176,9 +292,6 @@ async def multiple_users(db_session: AsyncSession) -> list[User]:
 
     await db_session.commit()
 
-    for user in users:
-        await db_session.refresh(user)
-
     return users
 
 
@@ -192,7 +305,6 @@ async def sample_transaction(
     )
     db_session.add(transaction)
     await db_session.commit()
-    await db_session.refresh(transaction)
     return transaction
 
 
@@ -201,10 +313,11 @@ async def create_test_user(
     session: AsyncSession, name: str, balance: Decimal = Decimal("0.00")
 ) -> User:
     """Helper to create a user in tests."""
-    user = User(name=name, balance=balance)
-    session.add(user)
+    result = await session.execute(
+        sa.insert(User).values(name=name, balance=balance).returning(User)
+    )
+    user = result.scalar_one()
     await session.commit()
-    await session.refresh(user)
     return user
 
 
@@ -218,5 +331,4 @@ async def create_test_transaction(
     transaction = Transaction(type=transaction_type, amount=amount, user_id=user_id)
     session.add(transaction)
     await session.commit()
-    await session.refresh(transaction)
     return transaction
@@ -6,6 +6,7 @@ import asyncio
 from decimal import Decimal
 
 import pytest
+import sqlalchemy as sa
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -13,179 +14,140 @@ from app.models import User
 from tests.integration.conftest import create_test_user
 
 
+async def fetch_balance(session: AsyncSession, user_id: str) -> Decimal:
+    """Read a user's committed balance without reloading the whole row."""
+    result = await session.execute(sa.select(User.balance).where(User.id == user_id))
+    return result.scalar_one()
+
+
+# (initial balance, concurrent (type, amount) requests, whether any request is
+# expected to be rejected for insufficient funds)
+CONCURRENT_SCENARIOS = {
+    "deposits_no_race_condition": (
+        Decimal("0.00"),
+        [
+            ("DEPOSIT", Decimal(amount))
+            for amount in ["100.00", "150.00", "75.00", "200.00", "50.00"]
+        ],
+        False,
+    ),
+    "withdrawals_with_sufficient_funds": (
+        Decimal("1000.00"),
+        [
+            ("WITHDRAW", Decimal(amount))
+            for amount in ["50.00", "75.00", "100.00", "25.00"]
+        ],
+        False,
+    ),
+    "withdrawals_insufficient_funds_handling": (
+        Decimal("100.00"),
+        # Total exceeds 100.00
+        [("WITHDRAW", Decimal(amount)) for amount in ["60.00", "70.00", "80.00"]],
+        True,
+    ),
+    "mixed_deposits_and_withdrawals": (
+        Decimal("500.00"),
+        [
+            ("DEPOSIT", Decimal("100.00")),
+            ("WITHDRAW", Decimal("50.00")),
+            ("DEPOSIT", Decimal("75.00")),
+            ("WITHDRAW", Decimal("25.00")),
+            ("DEPOSIT", Decimal("200.00")),
+            ("WITHDRAW", Decimal("100.00")),
+        ],
+        False,
+    ),
+}
+
+
+# JSON amounts with various precisions and what they round to
+ROUNDED_AMOUNTS = {
+    10.1: Decimal("10.10"),
+    10.12: Decimal("10.12"),
+    10.123: Decimal("10.12"),
+    10.1234: Decimal("10.12"),
+    10.99999: Decimal("11.00"),
+}
+
+
 class TestConcurrentTransactions:
     """Tests for concurrent transaction handling and race conditions."""
 
-    async def test_concurrent_deposits_no_race_condition(
-        self, client: AsyncClient, db_session: AsyncSession
+    @pytest.mark.parametrize(
+        "initial_balance, transactions, expect_rejections",
+        list(CONCURRENT_SCENARIOS.values()),
+        ids=list(CONCURRENT_SCENARIOS),
+    )
+    async def test_concurrent_transactions_single_user(
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        initial_balance: Decimal,
+        transactions: list[tuple[str, Decimal]],
+        expect_rejections: bool,
     ):
-        """Test that concurrent deposits don't create race conditions."""
-        # Create user with initial balance
-        user = await create_test_user(db_session, "Concurrent User", Decimal("0.00"))
-
-        # Define concurrent transactions
-        async def make_deposit(amount: float):
-            return await client.post(
-                "/api/transactions",
-                json={"type": "DEPOSIT", "amount": amount, "user_id": user.id},
-            )
-
-        # Execute multiple deposits concurrently
-        deposit_amounts = [100.00, 150.00, 75.00, 200.00, 50.00]
-        tasks = [make_deposit(amount) for amount in deposit_amounts]
+        """Test that concurrent requests on one user never race or overdraw."""
+        user = await create_test_user(db_session, "Concurrent User", initial_balance)
 
-        responses = await asyncio.gather(*tasks)
-
-        # Verify all deposits succeeded
-        for response in responses:
-            assert response.status_code == 201
-
-        # Verify final balance is correct
-        await db_session.refresh(user)
-        expected_balance = sum(Decimal(str(amount)) for amount in deposit_amounts)
-        assert user.balance == expected_balance
-
-    async def test_concurrent_withdrawals_with_sufficient_funds(
-        self, client: AsyncClient, db_session: AsyncSession
-    ):
-        """Test concurrent withdrawals when there are sufficient funds."""
-        # Create user with sufficient balance
-        initial_balance = Decimal("1000.00")
-        user = await create_test_user(db_session, "Rich User", initial_balance)
-
-        async def make_withdrawal(amount: float):
-            return await client.post(
-                "/api/transactions",
-                json={"type": "WITHDRAW", "amount": amount, "user_id": user.id},
+        responses = await asyncio.gather(
+            *(
+                client.post(
+                    "/api/transactions",
+                    json={"type": tx_type, "amount": str(amount), "user_id": user.id},
+                )
+                for tx_type, amount in transactions
             )
-
-        # Execute withdrawals that total less than balance
-        withdrawal_amounts = [50.00, 75.00, 100.00, 25.00]  # Total: 250.00
-        tasks = [make_withdrawal(amount) for amount in withdrawal_amounts]
-
-        responses = await asyncio.gather(*tasks)
-
-        # All withdrawals should succeed
-        for response in responses:
-            assert response.status_code == 201
-
-        # Verify final balance
-        await db_session.refresh(user)
-        expected_balance = initial_balance - sum(
-            Decimal(str(amount)) for amount in withdrawal_amounts
         )
-        assert user.balance == expected_balance
-
-    async def test_concurrent_withdrawals_insufficient_funds_handling(
-        self, client: AsyncClient, db_session: AsyncSession
-    ):
-        """Test handling of concurrent withdrawals when funds become insufficient."""
-        # Create user with limited balance
-        initial_balance = Decimal("100.00")
-        user = await create_test_user(db_session, "Limited User", initial_balance)
-
-        async def make_withdrawal(amount: float):
-            return await client.post(
-                "/api/transactions",
-                json={"type": "WITHDRAW", "amount": amount, "user_id": user.id},
-            )
-
-        # Execute withdrawals that together exceed balance
-        withdrawal_amounts = [60.00, 70.00, 80.00]  # Total exceeds 100.00
-        tasks = [make_withdrawal(amount) for amount in withdrawal_amounts]
-
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Some withdrawals should succeed, others should fail
-        successful_withdrawals = []
-        failed_withdrawals = []
-
-        for i, response in enumerate(responses):
-            if hasattr(response, "status_code"):
-                if response.status_code == 201:
-                    successful_withdrawals.append(withdrawal_amounts[i])
-                elif response.status_code == 400:
-                    failed_withdrawals.append(withdrawal_amounts[i])
 
-        # At least one should fail due to insufficient funds
-        assert len(failed_withdrawals) > 0
-
-        # Verify balance is not negative
-        await db_session.refresh(user)
-        assert user.balance >= Decimal("0.00")
-
-        # Verify balance consistency
-        total_withdrawn = sum(Decimal(str(amount)) for amount in successful_withdrawals)
-        expected_balance = initial_balance - total_withdrawn
-        assert user.balance == expected_balance
-
-    async def test_mixed_concurrent_transactions(
-        self, client: AsyncClient, db_session: AsyncSession
-    ):
-        """Test mixed deposits and withdrawals happening concurrently."""
-        # Create user with moderate balance
-        initial_balance = Decimal("500.00")
-        user = await create_test_user(db_session, "Active User", initial_balance)
-
-        async def make_transaction(tx_type: str, amount: float):
-            return await client.post(
-                "/api/transactions",
-                json={"type": tx_type, "amount": amount, "user_id": user.id},
-            )
+        # Every request either applies or is rejected for insufficient funds
+        expected_balance = initial_balance
+        rejected = 0
+        for (tx_type, amount), response in zip(transactions, responses):
+            if response.status_code == 400:
+                assert "Insufficient funds" in response.json()["detail"]
+                rejected += 1
+                continue
 
-        # Mix of deposits and withdrawals
-        transactions = [
-            ("DEPOSIT", 100.00),
-            ("WITHDRAW", 50.00),
-            ("DEPOSIT", 75.00),
-            ("WITHDRAW", 25.00),
-            ("DEPOSIT", 200.00),
-            ("WITHDRAW", 100.00),
-        ]
+            assert response.status_code == 201
+            if tx_type == "DEPOSIT":
+                expected_balance += amount
+            else:
+                expected_balance -= amount
 
-        tasks = [make_transaction(tx_type, amount) for tx_type, amount in transactions]
-        responses = await asyncio.gather(*tasks)
+        assert (rejected > 0) == expect_rejections
 
-        # Calculate expected balance
-        expected_balance = initial_balance
-        successful_transactions = []
-
-        for i, response in enumerate(responses):
-            if response.status_code == 201:
-                tx_type, amount = transactions[i]
-                successful_transactions.append((tx_type, amount))
-                if tx_type == "DEPOSIT":
-                    expected_balance += Decimal(str(amount))
-                else:
-                    expected_balance -= Decimal(str(amount))
-
-        # Verify final balance
-        await db_session.refresh(user)
-        assert user.balance == expected_balance
-        assert user.balance >= Decimal("0.00")  # Should never go negative
+        # Verify final balance matches exactly the requests that applied
+        balance = await fetch_balance(db_session, user.id)
+        assert balance == expected_balance
+        assert balance >= Decimal("0.00")  # Should never go negative
 
     async def test_concurrent_transactions_multiple_users(
-        self, client: AsyncClient, multiple_users: list[User]
+        self,
+        client: AsyncClient,
+        db_session: AsyncSession,
+        multiple_users: list[User],
     ):
         """Test concurrent transactions across multiple users."""
 
         async def user_transaction_sequence(user: User):
-            """Execute a sequence of transactions for a single user."""
-            transactions = [
-                await client.post(
+            """Execute a user's transactions concurrently.
+
+            The starting balance covers the withdrawal in any order.
+            """
+            return await asyncio.gather(
+                client.post(
                     "/api/transactions",
                     json={"type": "DEPOSIT", "amount": 200.00, "user_id": user.id},
                 ),
-                await client.post(
+                client.post(
                     "/api/transactions",
                     json={"type": "WITHDRAW", "amount": 50.00, "user_id": user.id},
                 ),
-                await client.post(
+                client.post(
                     "/api/transactions",
                     json={"type": "DEPOSIT", "amount": 100.00, "user_id": user.id},
                 ),
-            ]
-            return transactions
+            )
 
         # Execute transactions for all users concurrently
         tasks = [user_transaction_sequence(user) for user in multiple_users]
@@ -196,12 +158,15 @@ class TestConcurrentTransactions:
             for response in user_responses:
                 assert response.status_code == 201
 
-        # Verify each user's final balance
+        # Verify each user's final balance in one query
         # Each user: 1000.00 (initial) + 200.00 - 50.00 + 100.00 = 1250.00
-        for user in multiple_users:
-            balance_response = await client.get(f"/api/users/{user.id}/balance")
-            assert balance_response.status_code == 200
-            assert balance_response.json()["balance"] == "1250.00"
+        result = await db_session.execute(
+            sa.select(User.id, User.balance).where(
+                User.id.in_([user.id for user in multiple_users])
+            )
+        )
+        balances = dict(result.all())
+        assert balances == {user.id: Decimal("1250.00") for user in multiple_users}
 
 
 class TestDatabaseConsistency:
@@ -239,8 +204,8 @@ class TestDatabaseConsistency:
         assert "Insufficient funds" in response.json()["detail"]
 
         # Verify balance unchanged
-        await db_session.refresh(user)
-        assert user.balance == Decimal("10.00")
+        balance = await fetch_balance(db_session, user.id)
+        assert balance == Decimal("10.00")
 
     async def test_transaction_amount_positive_constraint(
         self, client: AsyncClient, sample_user: User
@@ -267,17 +232,26 @@ class TestDatabaseConsistency:
     ):
         """Test that decimal precision is handled correctly."""
         # Test with various decimal precisions
-        test_amounts = [10.1, 10.12, 10.123, 10.1234, 10.99999]
+        test_amounts = list(ROUNDED_AMOUNTS)
 
-        for amount in test_amounts:
-            response = await client.post(
-                "/api/transactions",
-                json={"type": "DEPOSIT", "amount": amount, "user_id": sample_user.id},
+        # Deposits are independent, so send them all at once
+        responses = await asyncio.gather(
+            *(
+                client.post(
+                    "/api/transactions",
+                    json={
+                        "type": "DEPOSIT",
+                        "amount": amount,
+                        "user_id": sample_user.id,
+                    },
+                )
+                for amount in test_amounts
             )
+        )
 
+        for amount, response in zip(test_amounts, responses):
             assert response.status_code == 201
 
             # Verify amount is properly rounded to 2 decimal places
             response_amount = Decimal(response.json()["amount"])
-            expected_amount = Decimal(str(amount)).quantize(Decimal("0.01"))
-            assert response_amount == expected_amount
+            assert response_amount == ROUNDED_AMOUNTS[amount]
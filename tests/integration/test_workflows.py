@@ -2,21 +2,26 @@
 Integration tests for complete end-to-end user workflows.
 """
 
+import asyncio
 from decimal import Decimal
 
 import pytest
 from httpx import AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models import Transaction, User
 
+CENT = Decimal("0.01")
+
+
+def _money(amount) -> str:
+    """Format an amount the way the API serializes balances (2 places)."""
+    return str(Decimal(str(amount)).quantize(CENT))
+
 
 class TestCompleteUserWorkflows:
     """End-to-end workflow tests simulating real user scenarios."""
 
-    async def test_new_user_complete_journey(
-        self, client: AsyncClient, db_session: AsyncSession
-    ):
+    async def test_new_user_complete_journey(self, client: AsyncClient):
         """Test complete journey of a new user from creation to multiple transactions."""
 
         # Step 1: Create new user
@@ -46,18 +51,19 @@ class TestCompleteUserWorkflows:
         balance_response = await client.get(f"/api/users/{user_id}/balance")
         assert balance_response.json()["balance"] == "500.00"
 
-        # Step 5: Make a withdrawal
-        withdrawal = await client.post(
-            "/api/transactions",
-            json={"type": "WITHDRAW", "amount": 150.00, "user_id": user_id},
+        # Steps 5 and 6: Make a withdrawal and another deposit; the balance
+        # covers the withdrawal in either order, so send them together
+        withdrawal, second_deposit = await asyncio.gather(
+            client.post(
+                "/api/transactions",
+                json={"type": "WITHDRAW", "amount": 150.00, "user_id": user_id},
+            ),
+            client.post(
+                "/api/transactions",
+                json={"type": "DEPOSIT", "amount": 200.00, "user_id": user_id},
+            ),
         )
         assert withdrawal.status_code == 201
-
-        # Step 6: Make another deposit
-        second_deposit = await client.post(
-            "/api/transactions",
-            json={"type": "DEPOSIT", "amount": 200.00, "user_id": user_id},
-        )
         assert second_deposit.status_code == 201
 
         # Step 7: Verify final balance
@@ -75,69 +81,80 @@ class TestCompleteUserWorkflows:
     async def test_multi_user_banking_scenario(self, client: AsyncClient):
         """Test scenario with multiple users performing various operations."""
 
-        # Create three users
-        users = []
+        # Create three users; each user's requests are independent of the
+        # others', so every step below runs for all users concurrently
         user_names = ["John", "Jane", "Bob"]
 
-        for name in user_names:
-            response = await client.post("/api/users", json={"name": name})
+        responses = await asyncio.gather(
+            *(client.post("/api/users", json={"name": name}) for name in user_names)
+        )
+        for response in responses:
             assert response.status_code == 201
-            users.append(response.json())
+        users = [response.json() for response in responses]
 
         # Each user makes initial deposits
         initial_deposits = [1000.00, 2000.00, 1500.00]
 
-        for i, (user, amount) in enumerate(zip(users, initial_deposits)):
-            response = await client.post(
-                "/api/transactions",
-                json={"type": "DEPOSIT", "amount": amount, "user_id": user["id"]},
+        responses = await asyncio.gather(
+            *(
+                client.post(
+                    "/api/transactions",
+                    json={"type": "DEPOSIT", "amount": amount, "user_id": user["id"]},
+                )
+                for user, amount in zip(users, initial_deposits)
             )
+        )
+        for response in responses:
             assert response.status_code == 201
 
         # Verify all balances
-        for i, user in enumerate(users):
-            balance_response = await client.get(f"/api/users/{user['id']}/balance")
-            expected_balance = f"{Decimal(str(initial_deposits[i])):.2f}"
+        balance_responses = await asyncio.gather(
+            *(client.get(f"/api/users/{user['id']}/balance") for user in users)
+        )
+        for balance_response, amount in zip(balance_responses, initial_deposits):
+            expected_balance = _money(amount)
             assert balance_response.json()["balance"] == expected_balance
 
-        # John withdraws money
-        john_withdrawal = await client.post(
-            "/api/transactions",
-            json={
-                "type": "WITHDRAW",
-                "amount": 300.00,
-                "user_id": users[0]["id"],  # John
-            },
+        john_withdrawal, jane_deposit, bob_large_withdrawal = await asyncio.gather(
+            # John withdraws money
+            client.post(
+                "/api/transactions",
+                json={
+                    "type": "WITHDRAW",
+                    "amount": 300.00,
+                    "user_id": users[0]["id"],  # John
+                },
+            ),
+            # Jane makes another deposit
+            client.post(
+                "/api/transactions",
+                json={
+                    "type": "DEPOSIT",
+                    "amount": 500.00,
+                    "user_id": users[1]["id"],  # Jane
+                },
+            ),
+            # Bob tries to withdraw more than he has (should fail)
+            client.post(
+                "/api/transactions",
+                json={
+                    "type": "WITHDRAW",
+                    "amount": 2000.00,  # More than his 1500 balance
+                    "user_id": users[2]["id"],  # Bob
+                },
+            ),
         )
         assert john_withdrawal.status_code == 201
-
-        # Jane makes another deposit
-        jane_deposit = await client.post(
-            "/api/transactions",
-            json={
-                "type": "DEPOSIT",
-                "amount": 500.00,
-                "user_id": users[1]["id"],  # Jane
-            },
-        )
         assert jane_deposit.status_code == 201
-
-        # Bob tries to withdraw more than he has (should fail)
-        bob_large_withdrawal = await client.post(
-            "/api/transactions",
-            json={
-                "type": "WITHDRAW",
-                "amount": 2000.00,  # More than his 1500 balance
-                "user_id": users[2]["id"],  # Bob
-            },
-        )
         assert bob_large_withdrawal.status_code == 400
 
         # Verify final balances
         expected_balances = ["700.00", "2500.00", "1500.00"]  # John, Jane, Bob
 
-        for i, (user, expected) in enumerate(zip(users, expected_balances)):
-            balance_response = await client.get(f"/api/users/{user['id']}/balance")
+        balance_responses = await asyncio.gather(
+            *(client.get(f"/api/users/{user['id']}/balance") for user in users)
+        )
+        for balance_response, expected in zip(balance_responses, expected_balances):
             assert balance_response.json()["balance"] == expected
 
     async def test_transaction_history_workflow(self, client: AsyncClient):
@@ -167,8 +184,10 @@ class TestCompleteUserWorkflows:
             transactions_made.append(response.json())
 
         # Verify we can retrieve each transaction by UID
-        for tx in transactions_made:
-            tx_response = await client.get(f"/api/transactions/{tx['uid']}")
+        tx_responses = await asyncio.gather(
+            *(client.get(f"/api/transactions/{tx['uid']}") for tx in transactions_made)
+        )
+        for tx, tx_response in zip(transactions_made, tx_responses):
             assert tx_response.status_code == 200
 
             retrieved_tx = tx_response.json()
@@ -241,11 +260,11 @@ class TestCompleteUserWorkflows:
             json={"type": "DEPOSIT", "amount": large_amount, "user_id": user_id},
         )
         assert large_deposit.status_code == 201
-        assert large_deposit.json()["amount"] == f"{Decimal(str(large_amount)):.2f}"
+        assert large_deposit.json()["amount"] == _money(large_amount)
 
         # Verify balance
         balance_response = await client.get(f"/api/users/{user_id}/balance")
-        assert balance_response.json()["balance"] == f"{Decimal(str(large_amount)):.2f}"
+        assert balance_response.json()["balance"] == _money(large_amount)
 
         # Make large withdrawal
         withdrawal_amount = 500000.00
@@ -258,7 +277,7 @@ class TestCompleteUserWorkflows:
         # Verify final balance
         expected_final = Decimal(str(large_amount)) - Decimal(str(withdrawal_amount))
         final_balance = await client.get(f"/api/users/{user_id}/balance")
-        assert final_balance.json()["balance"] == str(expected_final)
+        assert final_balance.json()["balance"] == _money(expected_final)
 
     async def test_error_recovery_workflow(self, client: AsyncClient):
         """Test system behavior and recovery from various error conditions."""
@@ -0,0 +1,43 @@
+"""
+Unit tests for health check endpoints.
+"""
+
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.health import health_check, readiness_check
+
+
+class TestHealthAPI:
+    """Test cases for liveness and readiness probes."""
+
+    async def test_health_check(self):
+        """Test liveness probe returns healthy status."""
+        result = await health_check()
+
+        assert result["status"] == "healthy"
+
+    async def test_readiness_check_ready(self, mock_db_session, mock_result):
+        """Test readiness probe when database and Redis respond."""
+        mock_db_session.execute.return_value = mock_result(1)
+        storage = AsyncMock()
+
+        result = await readiness_check(mock_db_session, storage)
+
+        assert result["status"] == "ready"
+        mock_db_session.execute.assert_called_once()
+        storage.set.assert_called_once_with("health_check", "test", ttl_seconds=1)
+
+    async def test_readiness_check_redis_down(self, mock_db_session, mock_result):
+        """Test readiness probe reports 503 when Redis is unreachable."""
+        mock_db_session.execute.return_value = mock_result(1)
+        storage = AsyncMock()
+        storage.set.side_effect = ConnectionError("Redis down")
+
+        with pytest.raises(HTTPException) as exc_info:
+            await readiness_check(mock_db_session, storage)
+
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.detail == "Redis not ready"
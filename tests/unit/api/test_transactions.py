@@ -8,11 +8,14 @@ from decimal import Decimal
 from unittest.mock import AsyncMock, Mock
 
 import pytest
-from fastapi import HTTPException
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
+from httpx import ASGITransport, AsyncClient
 
 from app import schemas
-from app.api.transactions import create_transaction, get_transaction
-from app.exceptions import PaymentError
+from app.api.base import get_idempotency_service, get_transaction_service
+from app.api.transactions import ROUTER, create_transaction, get_transaction
+from app.exceptions import BalanceLockedError, PaymentError, UserNotFoundError
 from app.services.idempotency_service import (
     IdempotencyConflictError,
     IdempotencyFailureError,
@@ -21,19 +24,23 @@ from app.services.idempotency_service import (
 from app.services.transaction_service import TransactionService
 from app.types import TransactionType
 from app.utils import IdempotencyRecord, IdempotencyStatus
+from tests.conftest import shared_mock_fixture
+
+mock_transaction_service = shared_mock_fixture(AsyncMock(spec=TransactionService))
+mock_idempotency_service = shared_mock_fixture(AsyncMock(spec=IdempotencyService))
 
 
 class TestTransactionAPI:
     """Test cases for transaction API endpoints."""
 
-    @pytest.fixture
+    @pytest.fixture(scope="class")
     def sample_transaction_create(self):
         """Sample transaction creation data."""
         return schemas.TransactionCreate(
             user_id="1", amount=Decimal("100.50"), type=TransactionType.DEPOSIT
         )
 
-    @pytest.fixture
+    @pytest.fixture(scope="class")
     def sample_transaction_response(self):
         """Sample transaction response."""
         return schemas.TransactionResponse(
@@ -44,16 +51,6 @@ class TestTransactionAPI:
             created_at=datetime.now(timezone.utc),
         )
 
-    @pytest.fixture
-    def mock_transaction_service(self):
-        """Mock transaction service."""
-        return AsyncMock(spec=TransactionService)
-
-    @pytest.fixture
-    def mock_idempotency_service(self):
-        """Mock idempotency service."""
-        return AsyncMock(spec=IdempotencyService)
-
     async def test_create_transaction_success_new_operation(
         self,
         sample_transaction_create,
@@ -103,9 +100,8 @@ class TestTransactionAPI:
         # Setup mocks for cached response
         idempotency_key = "test-key-123"
         mock_idempotency_service.get_or_generate_key.return_value = idempotency_key
-        mock_idempotency_service.execute_idempotent_operation.return_value = (
-            sample_transaction_response
-        )
+        cached = sample_transaction_response.model_dump(mode="json")
+        mock_idempotency_service.execute_idempotent_operation.return_value = cached
 
         # Execute
         result = await create_transaction(
@@ -116,21 +112,34 @@ class TestTransactionAPI:
         )
 
         # Verify
-        assert result == sample_transaction_response
+        assert isinstance(result, ORJSONResponse)
+        assert result.status_code == 201
+        assert json.loads(result.body) == cached
         mock_idempotency_service.execute_idempotent_operation.assert_called_once()
 
-    async def test_create_transaction_idempotency_conflict(
+    async def test_create_transaction_payment_error(
         self,
         sample_transaction_create,
         mock_transaction_service,
         mock_idempotency_service,
     ):
-        """Test handling idempotency conflict (operation in progress)."""
+        """Test handling payment error during transaction creation."""
         # Setup mocks
         idempotency_key = "test-key-123"
         mock_idempotency_service.get_or_generate_key.return_value = idempotency_key
+
+        # Configure the idempotency service to execute the operation and let it fail
+        async def mock_execute_operation(key, operation, ttl_seconds=None):
+            # This will call the actual operation function which should raise PaymentError
+            return await operation()
+
         mock_idempotency_service.execute_idempotent_operation.side_effect = (
-            IdempotencyConflictError("Operation in progress")
+            mock_execute_operation
+        )
+
+        # Mock transaction service to raise PaymentError
+        mock_transaction_service.create_transaction.side_effect = PaymentError(
+            "Insufficient funds"
         )
 
         # Execute & Verify
@@ -142,22 +151,56 @@ class TestTransactionAPI:
                 idempotency_service=mock_idempotency_service,
             )
 
-        assert exc_info.value.status_code == 409
-        assert "Request is currently being processed" in str(exc_info.value.detail)
+        assert exc_info.value.status_code == 400
 
-    async def test_create_transaction_idempotency_failure(
+    @pytest.mark.parametrize(
+        "error, expected_status, expected_detail, expected_headers",
+        [
+            pytest.param(
+                IdempotencyConflictError("Operation in progress"),
+                409,
+                "Request is currently being processed",
+                None,
+                id="idempotency_conflict",
+            ),
+            pytest.param(
+                IdempotencyFailureError("Insufficient funds"),
+                400,
+                "Insufficient funds",
+                None,
+                id="idempotency_failure",
+            ),
+            pytest.param(
+                UserNotFoundError("User with id 1 not found"),
+                404,
+                "User not found",
+                None,
+                id="user_not_found",
+            ),
+            pytest.param(
+                BalanceLockedError("busy"),
+                409,
+                "Please retry",
+                {"Retry-After": "1"},
+                id="balance_locked",
+            ),
+        ],
+    )
+    async def test_create_transaction_error_mapping(
         self,
         sample_transaction_create,
         mock_transaction_service,
         mock_idempotency_service,
+        error,
+        expected_status,
+        expected_detail,
+        expected_headers,
     ):
-        """Test handling cached failure result."""
+        """Test that errors raised by the operation map to HTTP errors."""
         # Setup mocks
         idempotency_key = "test-key-123"
         mock_idempotency_service.get_or_generate_key.return_value = idempotency_key
-        mock_idempotency_service.execute_idempotent_operation.side_effect = (
-            IdempotencyFailureError("Insufficient funds")
-        )
+        mock_idempotency_service.execute_idempotent_operation.side_effect = error
 
         # Execute & Verify
         with pytest.raises(HTTPException) as exc_info:
@@ -168,44 +211,34 @@ class TestTransactionAPI:
                 idempotency_service=mock_idempotency_service,
             )
 
-        assert exc_info.value.status_code == 400
-        assert "Insufficient funds" in str(exc_info.value.detail)
+        assert exc_info.value.status_code == expected_status
+        assert expected_detail in str(exc_info.value.detail)
+        assert exc_info.value.headers == expected_headers
 
-    async def test_create_transaction_payment_error(
-        self,
-        sample_transaction_create,
-        mock_transaction_service,
-        mock_idempotency_service,
+    async def test_create_transaction_rejects_overlong_idempotency_key(
+        self, mock_transaction_service, mock_idempotency_service
     ):
-        """Test handling payment error during transaction creation."""
-        # Setup mocks
-        idempotency_key = "test-key-123"
-        mock_idempotency_service.get_or_generate_key.return_value = idempotency_key
-
-        # Configure the idempotency service to execute the operation and let it fail
-        async def mock_execute_operation(key, operation, ttl_seconds=None):
-            # This will call the actual operation function which should raise PaymentError
-            return await operation()
-
-        mock_idempotency_service.execute_idempotent_operation.side_effect = (
-            mock_execute_operation
+        """Test that a key longer than the stored column is rejected with 422."""
+        app = FastAPI()
+        app.include_router(ROUTER)
+        app.dependency_overrides[get_transaction_service] = (
+            lambda: mock_transaction_service
         )
-
-        # Mock transaction service to raise PaymentError
-        mock_transaction_service.create_transaction.side_effect = PaymentError(
-            "Insufficient funds"
+        app.dependency_overrides[get_idempotency_service] = (
+            lambda: mock_idempotency_service
         )
 
-        # Execute & Verify
-        with pytest.raises(HTTPException) as exc_info:
-            await create_transaction(
-                data=sample_transaction_create,
-                idempotency_key=idempotency_key,
-                transaction_service=mock_transaction_service,
-                idempotency_service=mock_idempotency_service,
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            response = await client.post(
+                "/transactions",
+                json={"user_id": "1", "amount": "100.50", "type": "DEPOSIT"},
+                headers={"Idempotency-Key": "k" * 256},
             )
 
-        assert exc_info.value.status_code == 400
+        assert response.status_code == 422
+        mock_idempotency_service.execute_idempotent_operation.assert_not_called()
 
     async def test_get_transaction_success(
         self, sample_transaction_response, mock_transaction_service
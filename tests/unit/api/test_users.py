@@ -9,6 +9,8 @@ from app import schemas
 from app.api.users import create_user, get_user, get_user_balance
 from app.exceptions import UserExistsError
 
+_FIXED_TS = datetime(2024, 1, 1)
+
 
 class TestUserAPI:
     async def test_create_user_success(self, sample_user_create, sample_user):
@@ -31,28 +33,69 @@ class TestUserAPI:
         assert exc_info.value.detail == "User already exists"
 
     async def test_get_user_success(self, sample_user):
-        result = await get_user(sample_user)
-        assert isinstance(result, schemas.UserResponse)
+        mock_service = AsyncMock()
+        mock_service.get_user_dict_by_id.return_value = {
+            "id": sample_user.id,
+            "name": sample_user.name,
+            "balance": sample_user.balance,
+            "created_at": sample_user.created_at,
+        }
+
+        result = await get_user(sample_user.id, mock_service)
+
+        assert schemas.UserResponse.model_validate_json(
+            result.body
+        ) == schemas.UserResponse.model_validate(sample_user)
+        assert b'"balance":"100.00"' in result.body
+
+    async def test_get_user_not_found(self):
+        mock_service = AsyncMock()
+        mock_service.get_user_dict_by_id.return_value = None
+
+        with pytest.raises(HTTPException) as exc_info:
+            await get_user("missing", mock_service)
+
+        assert exc_info.value.status_code == 404
 
     async def test_get_user_balance_current(self, sample_user):
+        mock_user_service = AsyncMock()
+        mock_user_service.get_user_balance.return_value = sample_user.balance
         mock_service = AsyncMock()
 
-        result = await get_user_balance(sample_user, None, mock_service)
+        result = await get_user_balance(
+            sample_user.id, None, mock_user_service, mock_service
+        )
 
         assert isinstance(result, schemas.UserBalanceResponse)
         assert result.balance == sample_user.balance
+        mock_user_service.get_user_balance.assert_called_once_with(sample_user.id)
+        mock_service.get_user_balance_at_time.assert_not_called()
+
+    async def test_get_user_balance_user_not_found(self):
+        mock_user_service = AsyncMock()
+        mock_user_service.get_user_balance.return_value = None
+        mock_service = AsyncMock()
+
+        with pytest.raises(HTTPException) as exc_info:
+            await get_user_balance("missing", None, mock_user_service, mock_service)
+
+        assert exc_info.value.status_code == 404
         mock_service.get_user_balance_at_time.assert_not_called()
 
     async def test_get_user_balance_historical(self, sample_user):
         """Test getting historical user balance."""
         # Setup
+        mock_user_service = AsyncMock()
+        mock_user_service.get_user_balance.return_value = sample_user.balance
         mock_service = AsyncMock()
-        test_timestamp = datetime.now()
+        test_timestamp = _FIXED_TS
         expected_balance = Decimal("75.00")
         mock_service.get_user_balance_at_time.return_value = expected_balance
 
         # Execute
-        result = await get_user_balance(sample_user, test_timestamp, mock_service)
+        result = await get_user_balance(
+            sample_user.id, test_timestamp, mock_user_service, mock_service
+        )
 
         # Verify
         assert isinstance(result, schemas.UserBalanceResponse)
@@ -64,12 +107,16 @@ class TestUserAPI:
     async def test_get_user_balance_historical_zero(self, sample_user):
         """Test getting historical balance when no transactions exist."""
         # Setup
+        mock_user_service = AsyncMock()
+        mock_user_service.get_user_balance.return_value = sample_user.balance
         mock_service = AsyncMock()
-        test_timestamp = datetime.now()
+        test_timestamp = _FIXED_TS
         mock_service.get_user_balance_at_time.return_value = Decimal("0.00")
 
         # Execute
-        result = await get_user_balance(sample_user, test_timestamp, mock_service)
+        result = await get_user_balance(
+            sample_user.id, test_timestamp, mock_user_service, mock_service
+        )
 
         # Verify
         assert isinstance(result, schemas.UserBalanceResponse)
@@ -2,246 +2,348 @@
 Unit tests for TransactionRepository.
 """
 
-from datetime import datetime
+from datetime import datetime, timezone
 from decimal import Decimal
-from unittest.mock import AsyncMock, Mock, patch
+from types import SimpleNamespace
+from unittest.mock import Mock
 
 import pytest
-from sqlalchemy.exc import IntegrityError
-
-from app.exceptions import PaymentError
-from app.models import Transaction, User
-from app.repositories.transaction import TransactionRepository
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from app.exceptions import BalanceLockedError, PaymentError, UserNotFoundError
+from app.repositories.transaction import (
+    CHECKPOINT_GRACE,
+    CHECKPOINT_MIN_ROWS,
+    TransactionRepository,
+)
 from app.types import TransactionType
 
+_FIXED_TS = datetime(2024, 1, 1)
+_USER_ID = "5d6b7a1c-3f2e-4b8a-9c0d-1e2f3a4b5c6d"
+
 
 class TestTransactionRepository:
     """Test cases for TransactionRepository."""
 
     @pytest.fixture
-    def transaction_repo(self, mock_session_maker):
-        """Create TransactionRepository instance with mocked session maker."""
-        return TransactionRepository(mock_session_maker)
+    def transaction_repo(self, mock_db_session):
+        """Create TransactionRepository instance with mocked session."""
+        return TransactionRepository(mock_db_session)
 
-    async def test_create_transaction_with_balance_calculation_success(
+    async def test_create_transaction_with_balance_update_success(
         self,
         transaction_repo,
-        mock_session_maker,
         mock_db_session,
         sample_transaction_create,
-        sample_user,
         sample_transaction,
+        mock_result,
     ):
-        """Test successful transaction creation with balance calculation."""
-
+        """Test successful transaction creation with balance update."""
         # Setup
-        def mock_balance_calculator(balance, tx_type, amount):
-            return balance + amount
-
-        # Mock the private methods
-        transaction_repo._get_user_with_lock = AsyncMock(return_value=sample_user)
-        transaction_repo._calculate_new_balance = AsyncMock(
-            return_value=Decimal("150.00")
-        )
-        transaction_repo._create_transaction_record = AsyncMock(
-            return_value=sample_transaction
-        )
-        transaction_repo._update_user_balance = AsyncMock()
+        mock_db_session.execute.return_value = mock_result(sample_transaction)
 
         # Execute
-        result = await transaction_repo.create_transaction_with_balance_calculation(
+        result = await transaction_repo.create_transaction_with_balance_update(
             data=sample_transaction_create,
-            balance_calculator_func=mock_balance_calculator,
+            balance_delta=Decimal("50.00"),
+            idempotency_key="test-key",
         )
 
         # Verify
         assert result == sample_transaction
-        transaction_repo._get_user_with_lock.assert_called_once_with(
-            mock_db_session, "test-user-123"
-        )
-        transaction_repo._calculate_new_balance.assert_called_once_with(
-            sample_user.balance, sample_transaction_create, mock_balance_calculator
-        )
-        transaction_repo._create_transaction_record.assert_called_once_with(
-            mock_db_session, sample_transaction_create, Decimal("150.00")
+        mock_db_session.execute.assert_called_once()
+        params = mock_db_session.execute.call_args[0][1]
+        assert params == {
+            "user_id": "test-user-123",
+            "balance_delta": Decimal("50.00"),
+            "type": TransactionType.DEPOSIT,
+            "amount": Decimal("50.00"),
+            "idempotency_key": "test-key",
+        }
+        mock_db_session.commit.assert_called_once()
+        mock_db_session.rollback.assert_not_called()
+
+    async def test_create_transaction_with_balance_update_single_statement(
+        self, transaction_repo, mock_db_session, sample_transaction_create, mock_result
+    ):
+        """Test that the balance update and insert are emitted as one statement."""
+        # Setup
+        mock_db_session.execute.return_value = mock_result(Mock())
+
+        # Execute
+        await transaction_repo.create_transaction_with_balance_update(
+            data=sample_transaction_create,
+            balance_delta=Decimal("50.00"),
         )
-        transaction_repo._update_user_balance.assert_called_once_with(
-            mock_db_session, "test-user-123", Decimal("150.00")
+
+        # Verify
+        statement = mock_db_session.execute.call_args[0][0]
+        sql = " ".join(str(statement.compile(dialect=postgresql.dialect())).split())
+        assert sql.startswith("WITH updated_user AS (UPDATE users SET balance=")
+        assert "users.balance + %(balance_delta)s >= %(param_1)s" in sql
+        assert "RETURNING users.id) INSERT INTO transactions" in sql
+        assert "FROM updated_user ON CONFLICT (idempotency_key) DO NOTHING" in sql
+        assert sql.endswith(
+            "RETURNING transactions.uid, transactions.amount, transactions.type, "
+            "transactions.user_id, transactions.created_at"
         )
 
-    async def test_create_transaction_with_balance_calculation_integrity_error(
-        self, transaction_repo, sample_transaction_create
+    async def test_create_transaction_with_balance_update_replayed_key(
+        self,
+        transaction_repo,
+        mock_db_session,
+        sample_transaction_create,
+        sample_transaction,
+        mock_result,
     ):
-        """Test transaction creation with database integrity error."""
+        """Test that a reused idempotency key returns the original transaction."""
+        # Setup: the insert hits the key conflict, the lookup finds the original
+        mock_db_session.execute.side_effect = [
+            mock_result(None),
+            mock_result(sample_transaction),
+        ]
 
-        # Setup
-        def mock_balance_calculator(balance, tx_type, amount):
-            return balance + amount
+        # Execute
+        result = await transaction_repo.create_transaction_with_balance_update(
+            data=sample_transaction_create,
+            balance_delta=Decimal("50.00"),
+            idempotency_key="replayed-key",
+        )
 
-        # Mock session to raise IntegrityError
-        with patch.object(transaction_repo, "session_maker") as mock_maker:
-            mock_session = AsyncMock()
+        # Verify: the balance update that ran in the CTE is rolled back
+        assert result == sample_transaction
+        mock_db_session.rollback.assert_called_once()
+        mock_db_session.commit.assert_not_called()
+        assert mock_db_session.execute.call_args[0][1] == {
+            "idempotency_key": "replayed-key"
+        }
+
+    @pytest.mark.parametrize(
+        "idempotency_key, results, error, message",
+        [
+            pytest.param(
+                None, [None, False], UserNotFoundError, "test-user-123", id="no_user"
+            ),
+            pytest.param(
+                None,
+                [None, True],
+                PaymentError,
+                "Insufficient funds",
+                id="insufficient_funds",
+            ),
+            pytest.param(
+                "new-key",
+                [None, None, True],
+                PaymentError,
+                "Insufficient funds",
+                id="insufficient_funds_with_key",
+            ),
+        ],
+    )
+    async def test_create_transaction_with_balance_update_rejected(
+        self,
+        transaction_repo,
+        mock_db_session,
+        sample_transaction_create,
+        mock_result,
+        idempotency_key,
+        results,
+        error,
+        message,
+    ):
+        """Test that an insert refused by the balance update reports its cause."""
+        # Setup
+        mock_db_session.execute.side_effect = [mock_result(r) for r in results]
 
-            # Create a proper async context manager for session.begin()
-            mock_transaction_context = AsyncMock()
-            mock_transaction_context.__aenter__ = AsyncMock(
-                return_value=mock_transaction_context
-            )
-            mock_transaction_context.__aexit__ = AsyncMock(
-                side_effect=IntegrityError("", "", "")
+        # Execute & Verify
+        with pytest.raises(error, match=message):
+            await transaction_repo.create_transaction_with_balance_update(
+                data=sample_transaction_create,
+                balance_delta=Decimal("-500.00"),
+                idempotency_key=idempotency_key,
             )
 
-            # Mock session.begin() to return the async context manager (not a coroutine)
-            mock_session.begin = Mock(return_value=mock_transaction_context)
+        assert mock_db_session.execute.call_count == len(results)
+        mock_db_session.rollback.assert_called()
+        mock_db_session.commit.assert_not_called()
+
+    async def test_create_transaction_with_balance_update_commit_integrity_error(
+        self,
+        transaction_repo,
+        mock_db_session,
+        sample_transaction_create,
+        sample_transaction,
+        mock_result,
+    ):
+        """Test transaction creation with integrity error on commit."""
+        # Setup
+        mock_db_session.execute.return_value = mock_result(sample_transaction)
+        mock_db_session.commit.side_effect = IntegrityError("", "", "")
 
-            mock_maker.return_value.__aenter__ = AsyncMock(return_value=mock_session)
-            mock_maker.return_value.__aexit__ = AsyncMock(return_value=None)
+        # Execute & Verify
+        with pytest.raises(
+            PaymentError, match="Transaction already exists or user not found"
+        ):
+            await transaction_repo.create_transaction_with_balance_update(
+                data=sample_transaction_create,
+                balance_delta=Decimal("50.00"),
+            )
 
-            # Execute & Verify
-            with pytest.raises(
-                PaymentError, match="Transaction already exists or user not found"
-            ):
-                await transaction_repo.create_transaction_with_balance_calculation(
-                    data=sample_transaction_create,
-                    balance_calculator_func=mock_balance_calculator,
-                )
+        mock_db_session.rollback.assert_called_once()
 
-    async def test_calculate_new_balance_success(
-        self, transaction_repo, sample_transaction_create
+    async def test_create_transaction_with_balance_update_lock_timeout(
+        self, transaction_repo, mock_db_session, sample_transaction_create
     ):
-        """Test successful balance calculation."""
-
+        """Test that lock_timeout on the balance row maps to BalanceLockedError."""
         # Setup
-        def mock_calculator(balance, tx_type, amount):
-            return balance + amount
-
-        current_balance = Decimal("100.00")
+        lock_error = Exception("canceling statement due to lock timeout")
+        lock_error.sqlstate = "55P03"
+        mock_db_session.execute.side_effect = DBAPIError("UPDATE users", {}, lock_error)
 
-        # Execute
-        result = await transaction_repo._calculate_new_balance(
-            current_balance, sample_transaction_create, mock_calculator
-        )
+        # Execute & Verify
+        with pytest.raises(BalanceLockedError):
+            await transaction_repo.create_transaction_with_balance_update(
+                data=sample_transaction_create,
+                balance_delta=Decimal("50.00"),
+            )
 
-        # Verify
-        assert result == Decimal("150.00")
+        mock_db_session.rollback.assert_called_once()
 
-    async def test_calculate_new_balance_value_error(
-        self, transaction_repo, sample_transaction_create
+    async def test_get_transaction_by_idempotency_key_other_user(
+        self, transaction_repo, mock_db_session, mock_result
     ):
-        """Test balance calculation with value error."""
-
+        """Test that a key owned by another user's transaction is rejected."""
         # Setup
-        def mock_calculator(balance, tx_type, amount):
-            raise ValueError("Insufficient funds")
-
-        current_balance = Decimal("100.00")
+        stored = SimpleNamespace(user_id=_USER_ID)
+        mock_db_session.execute.return_value = mock_result(stored)
 
         # Execute & Verify
-        with pytest.raises(PaymentError, match="Insufficient funds"):
-            await transaction_repo._calculate_new_balance(
-                current_balance, sample_transaction_create, mock_calculator
+        with pytest.raises(PaymentError, match="already used by another user"):
+            await transaction_repo._get_transaction_by_idempotency_key(
+                mock_db_session, "1e0a2c4f-0000-4000-8000-000000000000", "test-key"
             )
 
-    async def test_get_user_with_lock_success(
-        self, transaction_repo, mock_db_session, sample_user, mock_result
+    async def test_get_transaction_by_idempotency_key_uppercase_replay(
+        self, transaction_repo, mock_db_session, mock_result
     ):
-        """Test successful user retrieval with lock."""
+        """Test that a replay spelling the user UUID in uppercase is accepted."""
         # Setup
-        mock_db_session.execute.return_value = mock_result(sample_user)
+        stored = SimpleNamespace(user_id=_USER_ID)
+        mock_db_session.execute.return_value = mock_result(stored)
 
         # Execute
-        result = await transaction_repo._get_user_with_lock(
-            mock_db_session, "test-user-123"
+        result = await transaction_repo._get_transaction_by_idempotency_key(
+            mock_db_session, _USER_ID.upper(), "test-key"
         )
 
         # Verify
-        assert result == sample_user
-        mock_db_session.execute.assert_called_once()
+        assert result is stored
 
-    async def test_get_user_with_lock_user_not_found(
+    async def test_get_transaction_by_idempotency_key_missing(
         self, transaction_repo, mock_db_session, mock_result
     ):
-        """Test user retrieval with lock when user doesn't exist."""
+        """Test that an unused or since deleted key finds no transaction."""
         # Setup
         mock_db_session.execute.return_value = mock_result(None)
 
-        # Execute & Verify
-        with pytest.raises(PaymentError, match="User with id test-user-123 not found"):
-            await transaction_repo._get_user_with_lock(mock_db_session, "test-user-123")
-
-    async def test_update_user_balance(self, transaction_repo, mock_db_session):
-        """Test user balance update."""
         # Execute
-        await transaction_repo._update_user_balance(
-            mock_db_session, "test-user-123", Decimal("150.00")
+        result = await transaction_repo._get_transaction_by_idempotency_key(
+            mock_db_session, _USER_ID, "test-key"
         )
 
         # Verify
-        mock_db_session.execute.assert_called_once()
+        assert result is None
 
-    async def test_create_transaction_record(
-        self,
-        transaction_repo,
-        mock_db_session,
-        sample_transaction_create,
-        sample_transaction,
+    @pytest.mark.parametrize("found", [True, False], ids=["found", "not_found"])
+    async def test_get_transaction_by_uid(
+        self, transaction_repo, mock_db_session, sample_transaction, mock_result, found
     ):
-        """Test transaction record creation."""
+        """Test getting transaction by UID, whether or not it exists."""
         # Setup
-        balance_after = Decimal("150.00")
-
-        with patch("app.repositories.transaction.Transaction") as MockTransaction:
-            MockTransaction.return_value = sample_transaction
+        expected = sample_transaction if found else None
+        mock_db_session.execute.return_value = mock_result(expected)
 
-            # Execute
-            result = await transaction_repo._create_transaction_record(
-                mock_db_session, sample_transaction_create, balance_after
-            )
+        # Execute
+        result = await transaction_repo.get_transaction_by_uid("test-transaction-123")
 
-            # Verify
-            assert result == sample_transaction
-            assert hasattr(result, "balance_after")
-            assert result.balance_after == balance_after
-            mock_db_session.add.assert_called_once_with(sample_transaction)
-            mock_db_session.flush.assert_called_once()
-            mock_db_session.refresh.assert_called_once_with(sample_transaction)
+        # Verify
+        assert result is expected
 
-    async def test_get_transaction_by_uid_found(
+    async def test_get_transaction_row_by_uid(
         self, transaction_repo, mock_db_session, sample_transaction, mock_result
     ):
-        """Test getting transaction by UID when it exists."""
+        """Test that only the response columns are fetched for a transaction."""
         # Setup
         mock_db_session.execute.return_value = mock_result(sample_transaction)
 
         # Execute
-        result = await transaction_repo.get_transaction_by_uid("test-transaction-123")
+        result = await transaction_repo.get_transaction_row_by_uid(
+            "test-transaction-123"
+        )
 
         # Verify
         assert result == sample_transaction
+        statement, params = mock_db_session.execute.call_args[0]
+        assert [column.name for column in statement.selected_columns] == [
+            "uid",
+            "amount",
+            "type",
+            "user_id",
+            "created_at",
+        ]
+        assert params == {"transaction_uid": "test-transaction-123"}
+
+    @pytest.mark.parametrize(
+        "history, expected_balance",
+        [
+            pytest.param((Decimal("250.00"), 3), Decimal("250.00"), id="transactions"),
+            pytest.param((Decimal("0"), 0), Decimal("0"), id="no_transactions"),
+        ],
+    )
+    async def test_get_user_balance_at_time(
+        self, transaction_repo, mock_db_session, mock_result, history, expected_balance
+    ):
+        """Test getting user balance at specific time."""
+        # Setup
+        mock_db_session.execute.return_value = mock_result(history)
+        test_timestamp = _FIXED_TS
+
+        # Execute
+        result = await transaction_repo.get_user_balance_at_time(
+            "test-user-123", test_timestamp
+        )
+
+        # Verify
+        assert result == expected_balance
+        mock_db_session.execute.assert_called_once()
+        mock_db_session.commit.assert_not_called()
 
-    async def test_get_transaction_by_uid_not_found(
+    async def test_get_user_balance_at_time_defaults_to_database_now(
         self, transaction_repo, mock_db_session, mock_result
     ):
-        """Test getting transaction by UID when it doesn't exist."""
+        """Test that a missing timestamp is resolved by the database, not Python."""
         # Setup
-        mock_db_session.execute.return_value = mock_result(None)
+        mock_db_session.execute.return_value = mock_result((Decimal("250.00"), 3))
 
         # Execute
-        result = await transaction_repo.get_transaction_by_uid(
-            "nonexistent-transaction"
-        )
+        result = await transaction_repo.get_user_balance_at_time("test-user-123")
 
         # Verify
-        assert result is None
+        assert result == Decimal("250.00")
+        query, params = mock_db_session.execute.call_args[0]
+        assert params == {"user_id": "test-user-123", "timestamp": None}
+        assert "coalesce(:timestamp, now())" in str(query)
 
-    async def test_get_user_balance_at_time(
+    async def test_get_user_balance_at_time_saves_checkpoint(
         self, transaction_repo, mock_db_session, mock_result
     ):
-        """Test getting user balance at specific time."""
+        """Test that a long summation leaves a checkpoint at the queried time."""
         # Setup
-        expected_balance = Decimal("250.00")
-        mock_db_session.execute.return_value = mock_result(expected_balance)
-        test_timestamp = datetime.now()
+        mock_db_session.execute.return_value = mock_result(
+            (Decimal("250.00"), CHECKPOINT_MIN_ROWS)
+        )
+        test_timestamp = datetime(2025, 1, 1, tzinfo=timezone.utc)
 
         # Execute
         result = await transaction_repo.get_user_balance_at_time(
@@ -249,20 +351,29 @@ class TestTransactionRepository:
         )
 
         # Verify
-        assert result == expected_balance
-
-    async def test_get_user_balance_at_time_no_transactions(
+        assert result == Decimal("250.00")
+        insert = mock_db_session.execute.call_args[0][0]
+        params = insert.compile().params
+        assert insert.table.name == "cached_balances"
+        assert params["as_of"] == test_timestamp
+        assert params["balance"] == Decimal("250.00")
+        mock_db_session.commit.assert_called_once()
+
+    async def test_save_balance_checkpoint_stays_behind_now(
         self, transaction_repo, mock_db_session, mock_result
     ):
-        """Test getting user balance when no transactions exist."""
+        """Test that a recent balance is re-summed up to the grace cutoff."""
         # Setup
-        mock_db_session.execute.return_value = mock_result(None)
-        test_timestamp = datetime.now()
+        mock_db_session.execute.return_value = mock_result((Decimal("200.00"), 10))
+        now = datetime.now(timezone.utc)
 
         # Execute
-        result = await transaction_repo.get_user_balance_at_time(
-            "test-user-123", test_timestamp
+        await transaction_repo._save_balance_checkpoint(
+            "test-user-123", now, Decimal("250.00")
         )
 
         # Verify
-        assert result == Decimal("0")
+        assert mock_db_session.execute.call_count == 2
+        params = mock_db_session.execute.call_args[0][0].compile().params
+        assert now - CHECKPOINT_GRACE <= params["as_of"] < now
+        assert params["balance"] == Decimal("200.00")
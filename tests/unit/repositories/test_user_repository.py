@@ -2,7 +2,7 @@
 Unit tests for UserRepository.
 """
 
-from unittest.mock import AsyncMock, Mock, patch
+from decimal import Decimal
 
 import pytest
 from sqlalchemy.exc import IntegrityError
@@ -16,96 +16,69 @@ class TestUserRepository:
     """Test cases for UserRepository."""
 
     @pytest.fixture
-    def user_repo(self, mock_session_maker):
-        """Create UserRepository instance with mocked session maker."""
-        return UserRepository(mock_session_maker)
+    def user_repo(self, mock_db_session):
+        """Create UserRepository instance with mocked session."""
+        return UserRepository(mock_db_session)
 
     async def test_create_user_success(
         self,
         user_repo,
-        mock_session_maker,
         mock_db_session,
         sample_user_create,
-        sample_user,
     ):
         """Test successful user creation."""
-        # Setup
-        with patch("app.repositories.user.User") as MockUser:
-            MockUser.return_value = sample_user
-
-            # Execute
-            result = await user_repo.create_user(sample_user_create)
-
-            # Verify
-            assert result == sample_user
-            MockUser.assert_called_once_with(name="John Doe")
-            mock_db_session.add.assert_called_once_with(sample_user)
-            mock_db_session.flush.assert_called_once()
-            mock_db_session.refresh.assert_called_once_with(sample_user)
+        # Execute
+        result = await user_repo.create_user(sample_user_create)
 
-    async def test_create_user_integrity_error(self, user_repo, sample_user_create):
-        """Test user creation with database integrity error."""
-        # Setup
-        with patch.object(user_repo, "session_maker") as mock_maker:
-            mock_session = AsyncMock()
-            mock_session.add = Mock()
-            mock_session.flush = AsyncMock(side_effect=IntegrityError("", "", ""))
-            mock_session.refresh = AsyncMock()
-
-            # Properly mock begin() context manager
-            begin_mock = AsyncMock()
-            begin_mock.__aenter__ = AsyncMock(return_value=None)
-            begin_mock.__aexit__ = AsyncMock(return_value=None)
-            mock_session.begin = Mock(return_value=begin_mock)
-
-            mock_maker.return_value.__aenter__ = AsyncMock(return_value=mock_session)
-            mock_maker.return_value.__aexit__ = AsyncMock(return_value=None)
-
-            # Execute & Verify
-            with pytest.raises(
-                UserExistsError, match="User with name 'John Doe' might already exist"
-            ):
-                await user_repo.create_user(sample_user_create)
-
-    async def test_get_user_by_id_found(
-        self, user_repo, mock_db_session, sample_user, mock_result
+        # Verify
+        assert isinstance(result, User)
+        assert result.name == "John Doe"
+        mock_db_session.add.assert_called_once_with(result)
+        mock_db_session.flush.assert_called_once()
+        mock_db_session.refresh.assert_not_called()
+        mock_db_session.commit.assert_called_once()
+
+    async def test_create_user_integrity_error(
+        self, user_repo, mock_db_session, sample_user_create
     ):
-        """Test getting user by ID when user exists."""
+        """Test user creation with database integrity error."""
         # Setup
-        mock_db_session.execute.return_value = mock_result(sample_user)
+        mock_db_session.flush.side_effect = IntegrityError("", "", "")
 
-        # Execute
-        result = await user_repo.get_user_by_id("test-user-123")
+        # Execute & Verify
+        with pytest.raises(
+            UserExistsError, match="User with name 'John Doe' might already exist"
+        ):
+            await user_repo.create_user(sample_user_create)
 
-        # Verify
-        assert result == sample_user
-        mock_db_session.execute.assert_called_once()
+        mock_db_session.rollback.assert_called_once()
+        mock_db_session.commit.assert_not_called()
 
-    async def test_get_user_by_id_not_found(
-        self, user_repo, mock_db_session, mock_result
+    @pytest.mark.parametrize("found", [True, False], ids=["found", "not_found"])
+    async def test_get_user_by_id(
+        self, user_repo, mock_db_session, sample_user, mock_result, found
     ):
-        """Test getting user by ID when user doesn't exist."""
+        """Test getting user by ID with one query, whether or not it exists."""
         # Setup
-        mock_db_session.execute.return_value = mock_result(None)
+        expected = sample_user if found else None
+        mock_db_session.execute.return_value = mock_result(expected)
 
         # Execute
-        result = await user_repo.get_user_by_id("nonexistent-user")
+        result = await user_repo.get_user_by_id("test-user-123")
 
         # Verify
-        assert result is None
+        assert result is expected
         mock_db_session.execute.assert_called_once()
 
-    async def test_get_user_by_id_database_query(
-        self, user_repo, mock_db_session, sample_user, mock_result
-    ):
-        """Test that get_user_by_id makes correct database query."""
+    async def test_get_user_balance(self, user_repo, mock_db_session, mock_result):
+        """Test that only the balance column is fetched."""
         # Setup
-        mock_db_session.execute.return_value = mock_result(sample_user)
+        mock_db_session.execute.return_value = mock_result(Decimal("100.00"))
 
         # Execute
-        await user_repo.get_user_by_id("test-user-123")
+        result = await user_repo.get_user_balance("test-user-123")
 
-        # Verify that execute was called with a select statement
-        mock_db_session.execute.assert_called_once()
-        call_args = mock_db_session.execute.call_args[0][0]
-        # We can't easily inspect the SQL, but we can verify it was called
+        # Verify
+        assert result == Decimal("100.00")
+        statement = mock_db_session.execute.call_args[0][0]
+        assert [column.name for column in statement.selected_columns] == ["balance"]
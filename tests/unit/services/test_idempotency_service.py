@@ -1,32 +1,62 @@
 """Tests for idempotency service."""
 
-import json
-from datetime import datetime
-from unittest.mock import AsyncMock, Mock, patch
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock
 
+import orjson
 import pytest
 
+from app import schemas
+from app.exceptions import BalanceLockedError
 from app.services.idempotency_service import (
     IdempotencyConflictError,
     IdempotencyFailureError,
     IdempotencyService,
 )
+from app.types import TransactionType
 from app.utils import IdempotencyRecord, IdempotencyStatus
+from tests.conftest import shared_mock_fixture
+
+mock_storage = shared_mock_fixture(AsyncMock())
+
+
+# Records already stored under a key, built once; the service never mutates them
+_CACHED_SUCCESS_DATA = {"transaction_id": "cached-123"}
+_CACHED_SUCCESS = IdempotencyRecord(
+    idempotency_key="test-key",
+    status=IdempotencyStatus.SUCCESS,
+    response_data=orjson.dumps(_CACHED_SUCCESS_DATA).decode(),
+)
+_CACHED_FAILURE = IdempotencyRecord(
+    idempotency_key="test-key",
+    status=IdempotencyStatus.FAILURE,
+    response_data=orjson.dumps({"error": "Cached payment error"}).decode(),
+)
+_IN_PROCESS = IdempotencyRecord(
+    idempotency_key="test-key", status=IdempotencyStatus.IN_PROCESS
+)
 
 
 class TestIdempotencyService:
     """Test cases for IdempotencyService."""
 
-    @pytest.fixture
-    def mock_storage(self):
-        """Create mock Redis storage."""
-        return AsyncMock()
-
     @pytest.fixture
     def service(self, mock_storage):
         """Create IdempotencyService with mock storage."""
         return IdempotencyService(mock_storage)
 
+    @pytest.fixture(scope="class")
+    def sample_transaction_response(self):
+        """Sample transaction response."""
+        return schemas.TransactionResponse(
+            uid="test-uuid-123",
+            user_id="1",
+            amount=Decimal("100.50"),
+            type=TransactionType.DEPOSIT,
+            created_at=datetime.now(timezone.utc),
+        )
+
     def test_generate_key(self, service):
         """Test key generation."""
         key = service.generate_key()
@@ -74,113 +104,97 @@ class TestIdempotencyService:
         )
 
     async def test_execute_idempotent_operation_success_new(
-        self, service, mock_storage
+        self, service, mock_storage, sample_transaction_response
     ):
         """Test executing new operation successfully."""
         key = "test-key"
-        expected_result = {"transaction_id": "123"}
 
-        # Mock no existing record
-        mock_storage.get_idempotency_record.return_value = None
         # Mock successful operation start
-        mock_storage.start_idempotent_operation.return_value = True
-
-        # Mock operation
-        mock_result = Mock()
-        mock_result.model_dump = Mock(return_value=expected_result)
+        started_record = IdempotencyRecord(idempotency_key=key)
+        mock_storage.begin_or_get.return_value = (True, started_record)
 
         async def mock_operation():
-            return mock_result
+            return sample_transaction_response
 
         result = await service.execute_idempotent_operation(key, mock_operation)
 
-        # Verify operation was executed and completed successfully
+        # Verify operation was executed and its JSON cached with the model name
+        assert result == sample_transaction_response
         mock_storage.complete_idempotent_operation.assert_called_once_with(
-            key=key, success=True, data=expected_result, ttl_seconds=None
+            key=key,
+            success=True,
+            data_json=sample_transaction_response.model_dump_json(),
+            schema_name="TransactionResponse",
+            ttl_seconds=None,
+            created_at=started_record.created_at,
         )
 
-    async def test_execute_idempotent_operation_cached_success(
-        self, service, mock_storage
+    async def test_execute_idempotent_operation_cached_model(
+        self, service, mock_storage, sample_transaction_response
     ):
-        """Test returning cached successful result."""
+        """Test that a tagged cached result is validated back into its model."""
         key = "test-key"
-        cached_data = {"transaction_id": "cached-123"}
-
-        # Mock existing successful record
-        mock_record = IdempotencyRecord(
-            idempotency_key=key,
-            status=IdempotencyStatus.SUCCESS,
-            response_data=json.dumps(cached_data),
+        mock_storage.begin_or_get.return_value = (
+            False,
+            IdempotencyRecord(
+                idempotency_key=key,
+                status=IdempotencyStatus.SUCCESS,
+                response_data=sample_transaction_response.model_dump_json(),
+                schema_name="TransactionResponse",
+            ),
         )
-        mock_storage.get_idempotency_record.return_value = mock_record
 
         async def mock_operation():
-            # This should not be called
             raise AssertionError("Operation should not be executed for cached result")
 
         result = await service.execute_idempotent_operation(key, mock_operation)
 
-        assert result == cached_data
-        # Verify storage methods were not called for new operation
-        mock_storage.start_idempotent_operation.assert_not_called()
-        mock_storage.complete_idempotent_operation.assert_not_called()
+        assert result == sample_transaction_response
 
-    async def test_execute_idempotent_operation_cached_failure(
+    async def test_execute_idempotent_operation_cached_success(
         self, service, mock_storage
     ):
-        """Test returning cached failure result."""
-        key = "test-key"
-        error_message = "Cached payment error"
-
-        # Mock existing failure record
-        mock_record = IdempotencyRecord(
-            idempotency_key=key,
-            status=IdempotencyStatus.FAILURE,
-            response_data=json.dumps({"error": error_message}),
-        )
-        mock_storage.get_idempotency_record.return_value = mock_record
+        """Test returning cached successful result."""
+        mock_storage.begin_or_get.return_value = (False, _CACHED_SUCCESS)
 
         async def mock_operation():
             # This should not be called
-            raise AssertionError("Operation should not be executed for cached failure")
-
-        with pytest.raises(IdempotencyFailureError, match=error_message):
-            await service.execute_idempotent_operation(key, mock_operation)
-
-    async def test_execute_idempotent_operation_in_progress(
-        self, service, mock_storage
-    ):
-        """Test handling operation already in progress."""
-        key = "test-key"
-
-        # Mock existing in-progress record
-        mock_record = IdempotencyRecord(
-            idempotency_key=key, status=IdempotencyStatus.IN_PROCESS
-        )
-        mock_storage.get_idempotency_record.return_value = mock_record
+            raise AssertionError("Operation should not be executed for cached result")
 
-        async def mock_operation():
-            return {"result": "test"}
+        result = await service.execute_idempotent_operation("test-key", mock_operation)
 
-        with pytest.raises(IdempotencyConflictError):
-            await service.execute_idempotent_operation(key, mock_operation)
+        assert result == _CACHED_SUCCESS_DATA
+        # Verify the cached result was not overwritten
+        mock_storage.complete_idempotent_operation.assert_not_called()
 
-    async def test_execute_idempotent_operation_start_conflict(
-        self, service, mock_storage
+    @pytest.mark.parametrize(
+        "existing_record, expected_error, match",
+        [
+            pytest.param(
+                _CACHED_FAILURE,
+                IdempotencyFailureError,
+                "Cached payment error",
+                id="cached_failure",
+            ),
+            pytest.param(_IN_PROCESS, IdempotencyConflictError, None, id="in_progress"),
+            # The record expired between the claim and the read
+            pytest.param(None, IdempotencyConflictError, None, id="start_conflict"),
+        ],
+    )
+    async def test_execute_idempotent_operation_existing_key_rejected(
+        self, service, mock_storage, existing_record, expected_error, match
     ):
-        """Test handling race condition when starting operation."""
-        key = "test-key"
-
-        # Mock no existing record initially
-        mock_storage.get_idempotency_record.return_value = None
-        # Mock failed operation start (race condition)
-        mock_storage.start_idempotent_operation.return_value = False
+        """Test that an unclaimable key raises without running the operation."""
+        mock_storage.begin_or_get.return_value = (False, existing_record)
 
         async def mock_operation():
-            return {"result": "test"}
+            # This should not be called
+            raise AssertionError("Operation should not be executed")
 
-        with pytest.raises(IdempotencyConflictError):
-            await service.execute_idempotent_operation(key, mock_operation)
+        with pytest.raises(expected_error, match=match):
+            await service.execute_idempotent_operation("test-key", mock_operation)
+
+        mock_storage.complete_idempotent_operation.assert_not_called()
 
     async def test_execute_idempotent_operation_handles_exceptions(
         self, service, mock_storage
@@ -189,10 +203,9 @@ class TestIdempotencyService:
         key = "test-key"
         error_message = "Test operation error"
 
-        # Mock no existing record
-        mock_storage.get_idempotency_record.return_value = None
         # Mock successful operation start
-        mock_storage.start_idempotent_operation.return_value = True
+        started_record = IdempotencyRecord(idempotency_key=key)
+        mock_storage.begin_or_get.return_value = (True, started_record)
 
         # Mock operation that raises exception
         async def failing_operation():
@@ -203,5 +216,28 @@ class TestIdempotencyService:
 
         # Verify failure was recorded
         mock_storage.complete_idempotent_operation.assert_called_once_with(
-            key=key, success=False, error=error_message, ttl_seconds=None
+            key=key,
+            success=False,
+            error=error_message,
+            ttl_seconds=None,
+            created_at=started_record.created_at,
+        )
+
+    async def test_execute_idempotent_operation_releases_key_on_retryable_error(
+        self, service, mock_storage
+    ):
+        """Test that a transient failure frees the key instead of caching it."""
+        key = "test-key"
+        mock_storage.begin_or_get.return_value = (
+            True,
+            IdempotencyRecord(idempotency_key=key),
         )
+
+        async def busy_operation():
+            raise BalanceLockedError("busy")
+
+        with pytest.raises(BalanceLockedError):
+            await service.execute_idempotent_operation(key, busy_operation)
+
+        mock_storage.delete.assert_called_once_with(key)
+        mock_storage.complete_idempotent_operation.assert_not_called()
@@ -2,39 +2,41 @@
 Unit tests for TransactionService.
 """
 
+from datetime import datetime
 from decimal import Decimal
-from unittest.mock import AsyncMock, Mock, patch
+from unittest.mock import AsyncMock, Mock
 
 import pytest
 from fastapi import HTTPException
 
 from app import schemas
-from app.services.transaction_service import TransactionService
+from app.services.transaction_service import (
+    TransactionService,
+    calculate_balance_delta,
+)
 from app.types import TransactionType
 
+_FIXED_TS = datetime(2024, 1, 1)
+
 
 class TestTransactionService:
     """Test cases for TransactionService."""
 
     @pytest.fixture
-    def transaction_service(self, mock_session_maker):
+    def transaction_service(self, mock_db_session):
         """Create TransactionService instance with mocked repository."""
-        with patch(
-            "app.services.transaction_service.TransactionRepository"
-        ) as MockRepo:
-            mock_repo = Mock()
-            MockRepo.return_value = mock_repo
-            service = TransactionService(mock_session_maker)
-            service.transaction_repo = mock_repo
-            return service
+        service = TransactionService(mock_db_session)
+        # A fresh repository mock per test, so stubs never leak between tests
+        service.transaction_repo = Mock()
+        return service
 
     async def test_create_transaction_success(
         self, transaction_service, sample_transaction_create, sample_transaction
     ):
         """Test successful transaction creation."""
         # Setup
-        transaction_service.transaction_repo.create_transaction_with_balance_calculation = AsyncMock(
-            return_value=sample_transaction
+        transaction_service.transaction_repo.create_transaction_with_balance_update = (
+            AsyncMock(return_value=sample_transaction)
         )
 
         # Execute
@@ -48,9 +50,28 @@ class TestTransactionService:
         assert result.user_id == sample_transaction.user_id
         assert result.created_at == sample_transaction.created_at
 
-        transaction_service.transaction_repo.create_transaction_with_balance_calculation.assert_called_once_with(
+        transaction_service.transaction_repo.create_transaction_with_balance_update.assert_called_once_with(
             data=sample_transaction_create,
-            balance_calculator_func=transaction_service._calculate_balance,
+            balance_delta=sample_transaction_create.amount,
+            idempotency_key=None,
+        )
+
+    async def test_create_transaction_invalidates_balance_cache(
+        self, transaction_service, sample_transaction_create, sample_transaction
+    ):
+        """Test that a balance change drops the cached balance."""
+        # Setup
+        transaction_service.balance_cache = AsyncMock()
+        transaction_service.transaction_repo.create_transaction_with_balance_update = (
+            AsyncMock(return_value=sample_transaction)
+        )
+
+        # Execute
+        await transaction_service.create_transaction(sample_transaction_create)
+
+        # Verify
+        transaction_service.balance_cache.invalidate.assert_called_once_with(
+            sample_transaction_create.user_id
         )
 
     async def test_get_transaction_success(
@@ -58,7 +79,7 @@ class TestTransactionService:
     ):
         """Test successful transaction retrieval."""
         # Setup
-        transaction_service.transaction_repo.get_transaction_by_uid = AsyncMock(
+        transaction_service.transaction_repo.get_transaction_row_by_uid = AsyncMock(
             return_value=sample_transaction
         )
 
@@ -68,14 +89,14 @@ class TestTransactionService:
         # Verify
         assert isinstance(result, schemas.TransactionResponse)
         assert result.uid == sample_transaction.uid
-        transaction_service.transaction_repo.get_transaction_by_uid.assert_called_once_with(
+        transaction_service.transaction_repo.get_transaction_row_by_uid.assert_called_once_with(
             "test-transaction-123"
         )
 
     async def test_get_transaction_not_found(self, transaction_service):
         """Test transaction retrieval when transaction doesn't exist."""
         # Setup
-        transaction_service.transaction_repo.get_transaction_by_uid = AsyncMock(
+        transaction_service.transaction_repo.get_transaction_row_by_uid = AsyncMock(
             return_value=None
         )
 
@@ -86,96 +107,29 @@ class TestTransactionService:
         assert exc_info.value.status_code == 404
         assert exc_info.value.detail == "Transaction not found"
 
-    def test_calculate_balance_deposit(self, transaction_service):
-        """Test balance calculation for deposit transaction."""
-        # Setup
-        current_balance = Decimal("100.00")
-        amount = Decimal("50.00")
-
-        # Execute
-        result = transaction_service._calculate_balance(
-            current_balance, TransactionType.DEPOSIT, amount
-        )
-
-        # Verify
-        assert result == Decimal("150.00")
-
-    def test_calculate_balance_withdraw_success(self, transaction_service):
-        """Test balance calculation for successful withdrawal."""
-        # Setup
-        current_balance = Decimal("100.00")
-        amount = Decimal("50.00")
-
+    @pytest.mark.parametrize(
+        "transaction_type, expected_delta",
+        [
+            pytest.param(TransactionType.DEPOSIT, Decimal("50.00"), id="deposit"),
+            pytest.param(TransactionType.WITHDRAW, Decimal("-50.00"), id="withdraw"),
+        ],
+    )
+    def test_calculate_balance_delta(self, transaction_type, expected_delta):
+        """Test that deposits add and withdrawals subtract the amount."""
         # Execute
-        result = transaction_service._calculate_balance(
-            current_balance, TransactionType.WITHDRAW, amount
-        )
+        result = calculate_balance_delta(transaction_type, Decimal("50.00"))
 
         # Verify
-        assert result == Decimal("50.00")
-
-    def test_calculate_balance_withdraw_insufficient_funds(self, transaction_service):
-        """Test balance calculation for withdrawal with insufficient funds."""
-        # Setup
-        current_balance = Decimal("100.00")
-        amount = Decimal("150.00")
-
-        # Execute & Verify
-        with pytest.raises(ValueError, match="Insufficient funds for withdrawal"):
-            transaction_service._calculate_balance(
-                current_balance, TransactionType.WITHDRAW, amount
-            )
-
-    def test_calculate_balance_unknown_type(self, transaction_service):
-        """Test balance calculation with unknown transaction type."""
-        # Setup
-        current_balance = Decimal("100.00")
-        amount = Decimal("50.00")
+        assert result == expected_delta
 
+    def test_calculate_balance_delta_unknown_type(self):
+        """Test balance delta calculation with unknown transaction type."""
         # Execute & Verify
         with pytest.raises(ValueError, match="Unknown transaction type"):
-            transaction_service._calculate_balance(
-                current_balance, "INVALID_TYPE", amount  # Invalid transaction type
+            calculate_balance_delta(
+                "INVALID_TYPE", Decimal("50.00")  # Invalid transaction type
             )
 
-    def test_calculate_withdrawal_balance_success(self, transaction_service):
-        """Test withdrawal balance calculation with sufficient funds."""
-        # Setup
-        current_balance = Decimal("100.00")
-        amount = Decimal("30.00")
-
-        # Execute
-        result = transaction_service._calculate_withdrawal_balance(
-            current_balance, amount
-        )
-
-        # Verify
-        assert result == Decimal("70.00")
-
-    def test_calculate_withdrawal_balance_insufficient_funds(self, transaction_service):
-        """Test withdrawal balance calculation with insufficient funds."""
-        # Setup
-        current_balance = Decimal("50.00")
-        amount = Decimal("100.00")
-
-        # Execute & Verify
-        with pytest.raises(ValueError, match="Insufficient funds for withdrawal"):
-            transaction_service._calculate_withdrawal_balance(current_balance, amount)
-
-    def test_calculate_withdrawal_balance_exact_amount(self, transaction_service):
-        """Test withdrawal balance calculation with exact balance amount."""
-        # Setup
-        current_balance = Decimal("100.00")
-        amount = Decimal("100.00")
-
-        # Execute
-        result = transaction_service._calculate_withdrawal_balance(
-            current_balance, amount
-        )
-
-        # Verify
-        assert result == Decimal("0.00")
-
     def test_build_transaction_response(self, transaction_service, sample_transaction):
         """Test building transaction response from transaction model."""
         # Execute
@@ -192,9 +146,7 @@ class TestTransactionService:
     async def test_get_user_balance_at_time(self, transaction_service):
         """Test getting user balance at specific time."""
         # Setup
-        from datetime import datetime
-
-        test_timestamp = datetime.now()
+        test_timestamp = _FIXED_TS
         expected_balance = Decimal("250.00")
 
         transaction_service.transaction_repo.get_user_balance_at_time = AsyncMock(
@@ -2,29 +2,36 @@
 Unit tests for UserService.
 """
 
-from unittest.mock import AsyncMock, patch
+from decimal import Decimal
+from unittest.mock import AsyncMock
 
 import pytest
 
-from app.services.user_service import UserService
+from app.repositories.user import UserRepository
+from app.services.user_service import USER_CACHE, UserService
+from app.utils import RedisBalanceCache
+from tests.conftest import shared_mock_fixture
+
+mock_user_repo = shared_mock_fixture(AsyncMock(spec=UserRepository))
+mock_balance_cache = shared_mock_fixture(AsyncMock(spec=RedisBalanceCache))
 
 
 class TestUserService:
     """Test cases for UserService."""
 
     @pytest.fixture
-    def user_service(self, mock_session_maker):
-        """Create UserService instance with mocked session maker."""
-        with patch("app.services.user_service.UserRepository"):
-            service = UserService(mock_session_maker)
-            return service
+    def user_service(self, mock_db_session, mock_user_repo):
+        """Create UserService instance with mocked repository."""
+        service = UserService(mock_db_session)
+        service.user_repo = mock_user_repo
+        return service
 
     async def test_create_user_success(
         self, user_service, sample_user_create, sample_user
     ):
         """Test successful user creation."""
         # Setup
-        user_service.user_repo.create_user = AsyncMock(return_value=sample_user)
+        user_service.user_repo.create_user.return_value = sample_user
 
         # Execute
         result = await user_service.create_user(sample_user_create)
@@ -36,7 +43,7 @@ class TestUserService:
     async def test_get_user_by_id_found(self, user_service, sample_user):
         """Test getting user by ID when user exists."""
         # Setup
-        user_service.user_repo.get_user_by_id = AsyncMock(return_value=sample_user)
+        user_service.user_repo.get_user_by_id.return_value = sample_user
 
         # Execute
         result = await user_service.get_user_by_id("test-user-123")
@@ -48,7 +55,7 @@ class TestUserService:
     async def test_get_user_by_id_not_found(self, user_service):
         """Test getting user by ID when user doesn't exist."""
         # Setup
-        user_service.user_repo.get_user_by_id = AsyncMock(return_value=None)
+        user_service.user_repo.get_user_by_id.return_value = None
 
         # Execute
         result = await user_service.get_user_by_id("nonexistent-user")
@@ -66,12 +73,83 @@ class TestUserService:
         # Setup
         from app.exceptions import UserExistsError
 
-        user_service.user_repo.create_user = AsyncMock(
-            side_effect=UserExistsError("User exists")
-        )
+        user_service.user_repo.create_user.side_effect = UserExistsError("User exists")
 
         # Execute & Verify
         with pytest.raises(UserExistsError):
             await user_service.create_user(sample_user_create)
 
         user_service.user_repo.create_user.assert_called_once_with(sample_user_create)
+
+    async def test_get_user_dict_by_id_cached(self, user_service):
+        """Test that repeated lookups reuse the cached profile but not the balance."""
+        # Setup
+        USER_CACHE.clear()
+        user_row = {"id": "test-user-123", "name": "John Doe", "balance": Decimal("1")}
+        user_service.user_repo.get_user_dict_by_id.return_value = user_row
+        user_service.user_repo.get_user_balance.return_value = Decimal("2")
+
+        # Execute
+        first = await user_service.get_user_dict_by_id("test-user-123")
+        second = await user_service.get_user_dict_by_id("test-user-123")
+
+        # Verify
+        assert first == user_row
+        assert second == {**user_row, "balance": Decimal("2")}
+        assert "balance" not in USER_CACHE.get("test-user-123")
+        user_service.user_repo.get_user_dict_by_id.assert_called_once_with(
+            "test-user-123"
+        )
+        user_service.user_repo.get_user_balance.assert_called_once_with("test-user-123")
+        USER_CACHE.clear()
+
+    async def test_get_user_dict_by_id_cache_ignores_case(self, user_service):
+        """Test that the profile cache is shared by both casings of a user id."""
+        # Setup
+        USER_CACHE.clear()
+        user_id = "5d6b7a1c-3f2e-4b8a-9c0d-1e2f3a4b5c6d"
+        user_row = {"id": user_id, "name": "John Doe", "balance": Decimal("1")}
+        user_service.user_repo.get_user_dict_by_id.return_value = user_row
+        user_service.user_repo.get_user_balance.return_value = Decimal("2")
+
+        # Execute
+        await user_service.get_user_dict_by_id(user_id.upper())
+        result = await user_service.get_user_dict_by_id(user_id)
+
+        # Verify
+        assert result == {**user_row, "balance": Decimal("2")}
+        user_service.user_repo.get_user_dict_by_id.assert_called_once()
+        USER_CACHE.clear()
+
+    async def test_get_user_balance_served_from_balance_cache(
+        self, user_service, mock_balance_cache
+    ):
+        """Test that a cached balance skips the database."""
+        # Setup
+        user_service.balance_cache = mock_balance_cache
+        user_service.balance_cache.get.return_value = Decimal("150.00")
+
+        # Execute
+        result = await user_service.get_user_balance("test-user-123")
+
+        # Verify
+        assert result == Decimal("150.00")
+        user_service.user_repo.get_user_balance.assert_not_called()
+
+    async def test_get_user_balance_fills_balance_cache(
+        self, user_service, mock_balance_cache
+    ):
+        """Test that a cache miss reads the database and stores the balance."""
+        # Setup
+        user_service.balance_cache = mock_balance_cache
+        user_service.balance_cache.get.return_value = None
+        user_service.user_repo.get_user_balance.return_value = Decimal("150.00")
+
+        # Execute
+        result = await user_service.get_user_balance("test-user-123")
+
+        # Verify
+        assert result == Decimal("150.00")
+        user_service.balance_cache.set.assert_called_once_with(
+            "test-user-123", Decimal("150.00")
+        )
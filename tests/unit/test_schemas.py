@@ -1,5 +1,6 @@
 from datetime import datetime
 from decimal import Decimal
+from types import SimpleNamespace
 
 import pytest
 from pydantic import ValidationError
@@ -28,7 +29,7 @@ class TestUserSchemas:
         with pytest.raises(ValidationError) as exc_info:
             schemas.UserCreate.model_validate({"name": "   "})
 
-        assert "Name cannot be empty" in str(exc_info.value)
+        assert "String should have at least 1 character" in str(exc_info.value)
 
     def test_user_create_name_too_long(self):
         """Test UserCreate with name exceeding max length."""
@@ -52,6 +53,7 @@ class TestUserSchemas:
         assert user.id == "test-123"
         assert user.name == "John Doe"
         assert user.balance == Decimal("100.50")
+        assert schemas.UserResponse.from_row(SimpleNamespace(**data)) == user
 
     def test_user_balance_response(self):
         """Test UserBalanceResponse."""
@@ -64,49 +66,51 @@ class TestUserSchemas:
 class TestTransactionSchemas:
     """Test cases for Transaction-related schemas."""
 
-    def test_transaction_create_valid_deposit(self):
-        """Test TransactionCreate with valid deposit data."""
-        data = {
-            "type": TransactionType.DEPOSIT,
-            "amount": Decimal("50.00"),
-            "user_id": "test-user-123",
-        }
+    @pytest.mark.parametrize(
+        "transaction_type, amount, expected_amount",
+        [
+            pytest.param(
+                TransactionType.DEPOSIT,
+                Decimal("50.00"),
+                Decimal("50.00"),
+                id="deposit",
+            ),
+            pytest.param(
+                TransactionType.WITHDRAW,
+                Decimal("25.00"),
+                Decimal("25.00"),
+                id="withdrawal",
+            ),
+            # Rounded to 2 decimal places
+            pytest.param(
+                TransactionType.DEPOSIT,
+                Decimal("50.123"),
+                Decimal("50.12"),
+                id="precision",
+            ),
+        ],
+    )
+    def test_transaction_create_valid(self, transaction_type, amount, expected_amount):
+        """Test TransactionCreate with valid data."""
+        data = {"type": transaction_type, "amount": amount, "user_id": "test-user-123"}
         transaction = schemas.TransactionCreate.model_validate(data)
 
-        assert transaction.type == TransactionType.DEPOSIT
-        assert transaction.amount == Decimal("50.00")
+        assert transaction.type == transaction_type
+        assert transaction.amount == expected_amount
         assert transaction.user_id == "test-user-123"
 
-    def test_transaction_create_valid_withdrawal(self):
-        """Test TransactionCreate with valid withdrawal data."""
-        data = {
-            "type": TransactionType.WITHDRAW,
-            "amount": Decimal("25.00"),
-            "user_id": "test-user-123",
-        }
-        transaction = schemas.TransactionCreate.model_validate(data)
-
-        assert transaction.type == TransactionType.WITHDRAW
-        assert transaction.amount == Decimal("25.00")
-
-    def test_transaction_create_zero_amount(self):
-        """Test TransactionCreate with zero amount."""
-        data = {
-            "type": TransactionType.DEPOSIT,
-            "amount": Decimal("0.00"),
-            "user_id": "test-user-123",
-        }
-
-        with pytest.raises(ValidationError) as exc_info:
-            schemas.TransactionCreate.model_validate(data)
-
-        assert "Input should be greater than 0" in str(exc_info.value)
-
-    def test_transaction_create_negative_amount(self):
-        """Test TransactionCreate with negative amount."""
+    @pytest.mark.parametrize(
+        "amount",
+        [
+            pytest.param(Decimal("0.00"), id="zero"),
+            pytest.param(Decimal("-10.00"), id="negative"),
+        ],
+    )
+    def test_transaction_create_non_positive_amount(self, amount):
+        """Test TransactionCreate rejects amounts that are not positive."""
         data = {
             "type": TransactionType.DEPOSIT,
-            "amount": Decimal("-10.00"),
+            "amount": amount,
             "user_id": "test-user-123",
         }
 
@@ -115,18 +119,6 @@ class TestTransactionSchemas:
 
         assert "Input should be greater than 0" in str(exc_info.value)
 
-    def test_transaction_create_amount_precision(self):
-        """Test TransactionCreate amount precision handling."""
-        data = {
-            "type": TransactionType.DEPOSIT,
-            "amount": Decimal("50.123"),  # 3 decimal places
-            "user_id": "test-user-123",
-        }
-        transaction = schemas.TransactionCreate.model_validate(data)
-
-        # Should be rounded to 2 decimal places
-        assert transaction.amount == Decimal("50.12")
-
     def test_transaction_response_valid(self):
         """Test TransactionResponse with valid data."""
         data = {
@@ -142,6 +134,7 @@ class TestTransactionSchemas:
         assert response.amount == Decimal("75.00")
         assert response.type == TransactionType.DEPOSIT
         assert response.user_id == "test-user-123"
+        assert schemas.TransactionResponse.from_row(SimpleNamespace(**data)) == response
 
     def test_balance_history_request_valid(self):
         """Test BalanceHistoryRequest with valid data."""
@@ -1,26 +1,30 @@
 """Tests for utility functions and classes."""
 
-from unittest.mock import AsyncMock, patch
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+import redis.asyncio as redis
 
-from app.utils import RedisIdempotencyStorage, get_idempotency_storage
+from app.utils import (
+    IdempotencyRecord,
+    IdempotencyStatus,
+    RedisBalanceCache,
+    RedisIdempotencyStorage,
+    TTLCache,
+    get_idempotency_storage,
+)
+from tests.conftest import shared_mock_fixture
+
+_REDIS_MOCK = AsyncMock()
+# register_script() is synchronous on the real client
+_REDIS_MOCK.register_script = MagicMock()
+mock_redis = shared_mock_fixture(_REDIS_MOCK)
 
 
 class TestRedisIdempotencyStorage:
     """Test cases for RedisIdempotencyStorage."""
 
-    @pytest.fixture
-    def mock_redis(self):
-        """Create mock Redis client."""
-        mock_redis = AsyncMock()
-        mock_redis.setex = AsyncMock()
-        mock_redis.get = AsyncMock()
-        mock_redis.delete = AsyncMock()
-        mock_redis.exists = AsyncMock()
-        mock_redis.close = AsyncMock()
-        return mock_redis
-
     @pytest.fixture
     def storage(self, mock_redis):
         """Create Redis storage with mocked Redis client."""
@@ -36,7 +40,7 @@ class TestRedisIdempotencyStorage:
         await storage.set(test_key, test_value, ttl_seconds=300)
 
         mock_redis.setex.assert_called_once_with(
-            name="idempotency:test_key", time=300, value='{"message": "test_response"}'
+            name=b"idempotency:test_key", time=300, value=b'{"message":"test_response"}'
         )
 
     async def test_get_value(self, storage, mock_redis):
@@ -46,7 +50,7 @@ class TestRedisIdempotencyStorage:
 
         result = await storage.get(test_key)
 
-        mock_redis.get.assert_called_once_with("idempotency:test_key")
+        mock_redis.get.assert_called_once_with(b"idempotency:test_key")
         assert result == {"message": "test_response"}
 
     async def test_get_nonexistent_value(self, storage, mock_redis):
@@ -64,7 +68,7 @@ class TestRedisIdempotencyStorage:
 
         result = await storage.delete(test_key)
 
-        mock_redis.delete.assert_called_once_with("idempotency:test_key")
+        mock_redis.delete.assert_called_once_with(b"idempotency:test_key")
         assert result is True
 
     async def test_delete_nonexistent_value(self, storage, mock_redis):
@@ -81,7 +85,7 @@ class TestRedisIdempotencyStorage:
 
         result = await storage.exists("test_key")
 
-        mock_redis.exists.assert_called_once_with("idempotency:test_key")
+        mock_redis.exists.assert_called_once_with(b"idempotency:test_key")
         assert result is True
 
     async def test_exists_false(self, storage, mock_redis):
@@ -92,12 +96,175 @@ class TestRedisIdempotencyStorage:
 
         assert result is False
 
+    @pytest.fixture
+    def mock_script(self, mock_redis):
+        """Attach a mock registered Lua script to the Redis client."""
+        script = AsyncMock()
+        mock_redis.register_script.return_value = script
+        return script
+
+    async def test_begin_or_get_claims_new_key(self, storage, mock_redis):
+        """Test claiming a fresh key with a single SET NX GET."""
+        mock_redis.set.return_value = None
+
+        started, record = await storage.begin_or_get("test_key", ttl_seconds=60)
+
+        assert started is True
+        assert record.status == IdempotencyStatus.IN_PROCESS
+        mock_redis.set.assert_awaited_once()
+        args, kwargs = mock_redis.set.call_args
+        assert args[0] == b"idempotency:test_key"
+        assert kwargs == {"ex": 60, "nx": True, "get": True}
+
+    async def test_begin_or_get_returns_existing_record(self, storage, mock_redis):
+        """Test that a duplicate key returns the stored record."""
+        existing = IdempotencyRecord(
+            idempotency_key="test_key", status=IdempotencyStatus.SUCCESS
+        )
+        mock_redis.set.return_value = existing.to_json().encode()
+
+        started, record = await storage.begin_or_get("test_key")
+
+        assert started is False
+        assert record.status == IdempotencyStatus.SUCCESS
+
+    async def test_complete_with_known_created_at_skips_read(self, storage, mock_redis):
+        """Test completion is a single SET XX when created_at is supplied."""
+        started = IdempotencyRecord(idempotency_key="test_key")
+        mock_redis.set.return_value = True
+
+        completed = await storage.complete_idempotent_operation(
+            "test_key",
+            success=True,
+            data={"uid": "1"},
+            ttl_seconds=60,
+            created_at=started.created_at,
+        )
+
+        assert completed is True
+        mock_redis.get.assert_not_called()
+        args, kwargs = mock_redis.set.call_args
+        assert args[0] == b"idempotency:test_key"
+        assert kwargs == {"ex": 60, "xx": True}
+        stored = IdempotencyRecord.model_validate_json(args[1])
+        assert stored.status == IdempotencyStatus.SUCCESS
+        assert stored.created_at == started.created_at
+        assert stored.updated_at >= started.created_at
+
+    async def test_begin_or_get_reuses_record_completed_locally(
+        self, storage, mock_redis
+    ):
+        """Test that a retry right after completion skips Redis."""
+        started = IdempotencyRecord(idempotency_key="test_key")
+        mock_redis.set.return_value = True
+        await storage.complete_idempotent_operation(
+            "test_key", success=True, data={"uid": "1"}, created_at=started.created_at
+        )
+
+        started, record = await storage.begin_or_get("test_key")
+
+        assert started is False
+        assert record.status == IdempotencyStatus.SUCCESS
+        mock_redis.set.assert_awaited_once()
+
+    async def test_delete_drops_locally_completed_record(self, storage, mock_redis):
+        """Test that a deleted key is claimed through Redis again."""
+        started = IdempotencyRecord(idempotency_key="test_key")
+        mock_redis.set.return_value = True
+        await storage.complete_idempotent_operation(
+            "test_key", success=True, data={"uid": "1"}, created_at=started.created_at
+        )
+        mock_redis.delete.return_value = 1
+
+        await storage.delete("test_key")
+        mock_redis.set.return_value = None
+        started, _ = await storage.begin_or_get("test_key")
+
+        assert started is True
+        assert mock_redis.set.await_count == 2
+
+    async def test_complete_without_created_at_runs_script(
+        self, storage, mock_redis, mock_script
+    ):
+        """Test completion updates the stored record in one script call."""
+        mock_script.return_value = 1
+
+        completed = await storage.complete_idempotent_operation(
+            "test_key", success=False, error="boom", ttl_seconds=60
+        )
+
+        assert completed is True
+        mock_redis.get.assert_not_called()
+        _, kwargs = mock_script.call_args
+        assert kwargs["keys"] == [b"idempotency:test_key"]
+        assert kwargs["args"][:4] == [60, "failure", '{"error":"boom"}', ""]
+
+    async def test_complete_without_created_at_missing_key(self, storage, mock_script):
+        """Test completion reports a missing record."""
+        mock_script.return_value = 0
+
+        completed = await storage.complete_idempotent_operation(
+            "test_key", success=True, data={"uid": "1"}
+        )
+
+        assert completed is False
+
+    async def test_complete_registers_script_once(
+        self, storage, mock_redis, mock_script
+    ):
+        """Test that the Lua script is registered once and then reused."""
+        mock_script.return_value = 1
+
+        await storage.complete_idempotent_operation("first", success=True)
+        await storage.complete_idempotent_operation("second", success=True)
+
+        mock_redis.register_script.assert_called_once()
+
+    def test_new_record_reads_clock_once(self):
+        """Test that a new record's update time defaults to its creation time."""
+        record = IdempotencyRecord(idempotency_key="test_key")
+
+        assert record.updated_at == record.created_at
+
+    def test_record_json_omits_defaults(self):
+        """Test that stored records leave out default fields and still load."""
+        record = IdempotencyRecord(idempotency_key="test_key")
+
+        serialized = record.to_json()
+
+        assert '"status"' not in serialized
+        assert '"ttl"' not in serialized
+        assert IdempotencyRecord.model_validate_json(serialized) == record
+
     async def test_close(self, storage, mock_redis):
         """Test closing Redis connection."""
         await storage.close()
 
         mock_redis.aclose.assert_called_once()
 
+    async def test_client_uses_bounded_pool(self):
+        """Test that the lazily created client shares a bounded connection pool."""
+        storage = RedisIdempotencyStorage(max_connections=8)
+
+        client = await storage._get_redis()
+
+        assert isinstance(client.connection_pool, redis.BlockingConnectionPool)
+        assert client.connection_pool.max_connections == 8
+        assert client.connection_pool.connection_kwargs["decode_responses"] is False
+        assert await storage._get_redis() is client
+        await storage.close()
+
+    async def test_close_releases_pool(self):
+        """Test that closing the storage disconnects its connection pool."""
+        storage = RedisIdempotencyStorage()
+        client = await storage._get_redis()
+        client.connection_pool.disconnect = AsyncMock()
+
+        await storage.close()
+
+        client.connection_pool.disconnect.assert_awaited_once()
+        assert storage._redis is None
+
 
 class TestGetIdempotencyStorage:
     """Test cases for get_idempotency_storage function."""
@@ -107,9 +274,90 @@ class TestGetIdempotencyStorage:
         storage = get_idempotency_storage("redis://localhost:6379")
         assert isinstance(storage, RedisIdempotencyStorage)
 
-    @patch("app.utils._idempotency_storage", None)
-    def test_singleton_behavior(self):
+    def test_singleton_behavior(self, monkeypatch):
         """Test that the same instance is returned on multiple calls."""
+        monkeypatch.setattr("app.utils._idempotency_storage", None)
         storage1 = get_idempotency_storage()
         storage2 = get_idempotency_storage()
         assert storage1 is storage2
+
+
+class TestTTLCache:
+    """Test cases for TTLCache."""
+
+    def test_set_get_and_invalidate(self):
+        """Test basic set/get and explicit invalidation."""
+        cache = TTLCache(maxsize=10, ttl_seconds=60)
+        cache.set("key", "value")
+
+        assert cache.get("key") == "value"
+
+        cache.invalidate("key")
+
+        assert cache.get("key") is None
+
+    def test_expired_entry_is_dropped(self):
+        """Test that entries are not returned after their TTL."""
+        cache = TTLCache(maxsize=10, ttl_seconds=0)
+        cache.set("key", "value")
+
+        assert cache.get("key") is None
+
+    def test_evicts_oldest_when_full(self):
+        """Test that the oldest entry is evicted when maxsize is reached."""
+        cache = TTLCache(maxsize=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("c", 3)
+
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+        assert cache.get("c") == 3
+
+
+class TestRedisBalanceCache:
+    """Test cases for RedisBalanceCache."""
+
+    @pytest.fixture
+    def cache(self, mock_redis):
+        """Create balance cache with mock Redis."""
+        cache = RedisBalanceCache("redis://localhost:6379", ttl_ms=500)
+        cache._redis = mock_redis
+        return cache
+
+    async def test_get_hit(self, cache, mock_redis):
+        """Test that a cached balance is returned as Decimal."""
+        mock_redis.get.return_value = "150.00"
+
+        assert await cache.get("user-1") == Decimal("150.00")
+        mock_redis.get.assert_called_once_with("balance:user-1")
+
+    async def test_get_redis_error_is_miss(self, cache, mock_redis):
+        """Test that Redis errors are treated as cache misses."""
+        mock_redis.get.side_effect = redis.RedisError("down")
+
+        assert await cache.get("user-1") is None
+
+    async def test_set_uses_millisecond_ttl(self, cache, mock_redis):
+        """Test that balances are stored with the configured TTL."""
+        await cache.set("user-1", Decimal("150.00"))
+
+        mock_redis.set.assert_called_once_with("balance:user-1", "150.00", px=500)
+
+    async def test_invalidate(self, cache, mock_redis):
+        """Test that invalidation deletes the cached balance."""
+        await cache.invalidate("user-1")
+
+        mock_redis.delete.assert_called_once_with("balance:user-1")
+
+    async def test_keys_ignore_user_id_case(self, cache, mock_redis):
+        """Test that a write invalidates the balance read under another casing."""
+        user_id = "5d6b7a1c-3f2e-4b8a-9c0d-1e2f3a4b5c6d"
+        mock_redis.get.return_value = None
+
+        await cache.get(user_id.upper())
+        await cache.invalidate(user_id)
+
+        key = f"balance:{user_id}"
+        mock_redis.get.assert_called_once_with(key)
+        mock_redis.delete.assert_called_once_with(key)